@@ -3,6 +3,7 @@ WeatherBar MacOS
 Copyright (c) 2020 Wai Lam Fergus Yip
 '''
 
+import atexit
 import datetime
 import os
 import webbrowser
@@ -12,59 +13,38 @@ import logging
 import rumps
 import requests
 import geopy
-from geopy.geocoders import Nominatim
 
 from error import LocationNotFoundError
 from climacell import ClimaCell, APIKeyError
-from ip_api import get_ip_location
-from config import Config, valid_config
+import geo
+from geo import get_location, modify_location, valid_geopy_location
+from config import (APP_NAME, CONFIG_NAME, DEFAULT_CONFIG, INTERVAL_SECONDS,
+                    TILES_NAME, Config, valid_config)
+from memory import MemoryWatchdog
+from history import HistoryRecorder, reading_from_weather
+from prefetch import API_BUDGET, LocationHistory, Prefetcher, QuotaBudget
+from tiles import TileCache, location_key
+from view import MenuView, error_state, get_icon, weather_state
 
 ssl._create_default_https_context = ssl._create_unverified_context
 
-APP_NAME = 'WeatherBar'
-GEOCODER = Nominatim(user_agent=APP_NAME)
-INTERVAL_SECONDS = 300
-CONFIG_NAME = 'config.json'
+MAX_WEATHER_ATTEMPTS = 3
+HISTORY_NAME = 'history.bin'
+LOCATIONS_NAME = 'locations.json'
 APP_SUPPORT_DIR = rumps.application_support(APP_NAME)
 CONFIG = Config(APP_SUPPORT_DIR, CONFIG_NAME)
+HISTORY = HistoryRecorder(APP_SUPPORT_DIR, HISTORY_NAME)
 
-WEATHER_ICONS = {
-    '☀️': ['clear'],
-    '⛅': ['partly_cloudy'],
-    '⛈': ['tstorm'],
-    '🌤': ['mostly_clear'],
-    '🌥': ['mostly_cloudy'],
-    '☁️': ['cloudy'],
-    '🌧': ['rain_heavy', 'rain', 'rain_light', 'drizzle'],
-    '🌨': [
-        'snow_heavy',
-        'snow',
-        'snow_light',
-        'flurries',
-        'freezing_rain_heavy',
-        'freezing_rain',
-        'freezing_rain_light',
-        'freezing_drizzle',
-        'ice_pellets_heavy',
-        'ice_pellets',
-        'ice_pellets_light',
-    ],
-    '🌫': ['fog', 'fog_light'],
-}
-
-
-def get_icon(weather_code):
-    ''' Get weather icon from weather code '''
-    for emoji in WEATHER_ICONS:
-        if weather_code in WEATHER_ICONS[emoji]:
-            return emoji
-    return None
+# Write out the readings not yet in a full batch, should the app exit
+# without going through quit_app
+atexit.register(HISTORY.flush)
 
 
 class WeatherBarApp(rumps.App):
     ''' WeatherBarApp '''
     def __init__(self):
-        super(WeatherBarApp, self).__init__('WeatherBar')
+        # Quit through quit_app, so that the history is written out first
+        super(WeatherBarApp, self).__init__('WeatherBar', quit_button=None)
         self.logger = self.logger_init()
         self.logger.info('Initialising application...')
 
@@ -89,9 +69,14 @@ class WeatherBarApp(rumps.App):
                 callback=self.live_location_btn,
             ),
             'about':
-            rumps.MenuItem(title='About', callback=self.about)
+            rumps.MenuItem(title='About', callback=self.about),
+            'quit':
+            rumps.MenuItem(title='Quit', callback=self.quit_app)
         }
 
+        self.view = MenuView(self.menu_items)
+        self.view.add_target('app', self)
+
         # App Menu ----------------------------------------------
 
         self.menu.add(self.menu_items['last_updated_menu'])
@@ -105,26 +90,33 @@ class WeatherBarApp(rumps.App):
         self.menu.add(rumps.separator)  # -----------------------
 
         self.menu.add(self.menu_items['about'])
+        self.menu.add(self.menu_items['quit'])
 
         # -------------------------------------------------------
 
-        self.default_config = {
-            'location': '175 5th Avenue NYC',
-            'latitude': 40.7410861,
-            'longitude': -73.9896297241625,
-            'unit_system': 'si',
-            'apikey': '',
-            'live_location': False,
-        }
+        self.default_config = dict(DEFAULT_CONFIG)
         self.config = self.default_config
 
-        self.weather = None
+        self.weather_code = None
         self.temp = 0
 
+        self.memory = MemoryWatchdog()
+        self.memory.handle_signals(self.logger)
+
         self.timer = rumps.Timer(self.update_weather_timer, INTERVAL_SECONDS)
 
         self.climacell = ClimaCell()
 
+        self.weather_cache = TileCache(
+            os.path.join(APP_SUPPORT_DIR, TILES_NAME))
+        self.refreshed_at = None
+        self.locations = LocationHistory(Config(APP_SUPPORT_DIR,
+                                                LOCATIONS_NAME))
+        self.locations.load()
+        self.budget = QuotaBudget(*API_BUDGET)
+        self.prefetcher = Prefetcher(self.climacell, self.weather_cache,
+                                     self.locations, self.budget)
+
         self.start()
 
     def start(self):
@@ -167,7 +159,8 @@ class WeatherBarApp(rumps.App):
                     'Something went wrong whilst loading local config')
 
             if not self.confirm_location(local_config['location']):
-                self.prefs(local_config['location'])
+                if self.prefs(local_config['location']):
+                    self.update_weather()
                 return
             self.config = local_config
 
@@ -191,54 +184,59 @@ class WeatherBarApp(rumps.App):
     def handle_missing_apikey(self):
         ''' Open window to alert user of missing api key '''
 
-        self.logger.info('Opening \'API Key is required\' window')
-
-        response = rumps.alert(
-            title='ClimaCell API Key is required',
-            message=(
-                'Click \"Register\" or go to the following url:\n'
-                f'{self.climacell.signup_link}\n\n'
-                'Note: This application is not affiliated with ClimaCell'),
-            ok='Register',
-            cancel='Quit',
-            other='I have one')
-
-        if response == 0:  # Quit
-            self.logger.info('Quiting application')
-            rumps.quit_application()
+        while True:
+            self.logger.info('Opening \'API Key is required\' window')
+
+            response = rumps.alert(
+                title='ClimaCell API Key is required',
+                message=(
+                    'Click \"Register\" or go to the following url:\n'
+                    f'{self.climacell.signup_link}\n\n'
+                    'Note: This application is not affiliated with ClimaCell'
+                ),
+                ok='Register',
+                cancel='Quit',
+                other='I have one')
+
+            if response == 0:  # Quit
+                self.logger.info('Quiting application')
+                self.quit_app(None)
+                return
 
-        if response == 1:  # Register
-            self.logger.info('Opening register link')
-            webbrowser.open(self.climacell.signup_link)
+            if response == 1:  # Register
+                self.logger.info('Opening register link')
+                webbrowser.open(self.climacell.signup_link)
 
-        if not self.set_apikey():  # Cancelled enter api key window
-            self.handle_missing_apikey()  # Reopen api required alert
+            if self.set_apikey():
+                return
+            # Cancelled enter api key window, reopen api required alert
 
     def set_apikey(self):
         ''' Open window to set api key '''
-        self.logger.info('Opening \'set_apikey\' window')
-        api_key_window = rumps.Window(
-            title='Enter your API key:',
-            message='Right click to paste',
-            default_text=self.config['apikey'],
-            ok='Confirm',
-            cancel='I don\'t have one',
-            dimensions=(250, 20),
-        )
-
-        response = api_key_window.run()
-
-        if response.clicked == 0:  # Cancel
-            self.logger.info('Cancelled \'set_apikey\' window')
-            return False
-
-        apikey = response.text.strip()
-
-        if not apikey:
-            self.logger.info('API Key was not entered')
-            rumps.alert(title='You did not enter an API Key',
-                        message='Try again')
-            return self.set_apikey()
+        apikey = ''
+        while not apikey:
+            self.logger.info('Opening \'set_apikey\' window')
+            api_key_window = rumps.Window(
+                title='Enter your API key:',
+                message='Right click to paste',
+                default_text=self.config['apikey'],
+                ok='Confirm',
+                cancel='I don\'t have one',
+                dimensions=(250, 20),
+            )
+
+            response = api_key_window.run()
+
+            if response.clicked == 0:  # Cancel
+                self.logger.info('Cancelled \'set_apikey\' window')
+                return False
+
+            apikey = response.text.strip()
+
+            if not apikey:
+                self.logger.info('API Key was not entered')
+                rumps.alert(title='You did not enter an API Key',
+                            message='Try again')
 
         self.logger.info('Setting API Key')
         self.config['apikey'] = apikey
@@ -251,6 +249,7 @@ class WeatherBarApp(rumps.App):
         ''' Function to call update_weather from timer '''
         self.logger.info('Calling update_weather function from timer')
         self.update_weather()
+        self.memory.sample()
 
     def update_weather(self, silent=True):
         ''' Update the weather '''
@@ -266,6 +265,8 @@ class WeatherBarApp(rumps.App):
                 self.climacell.set_location(local_config['latitude'],
                                             local_config['longitude'])
                 location = local_config['location']
+                self.locations.visit(location, local_config['latitude'],
+                                     local_config['longitude'])
             except LocationNotFoundError:
                 self.logger.error(
                     'LocationNotFoundError: Could not load local config')
@@ -277,61 +278,107 @@ class WeatherBarApp(rumps.App):
                                              change_icon=not silent)
                 return
 
-        try:
-            self.logger.info('Trying to get weather')
-            self.weather = self.climacell.get_weather()
+        for _ in range(MAX_WEATHER_ATTEMPTS):
+            try:
+                self.logger.info('Trying to get weather')
+                weather, age = self.get_weather()
+
+                self.logger.info(f'Obtained weather at {location}')
+                self.temp = int(round(weather['temp']['value'], 0))
+                self.weather_code = weather['weather_code']['value']
+                if age is None:  # Cached weather may be older and from nearby
+                    HISTORY.record(
+                        reading_from_weather(
+                            weather,
+                            fahrenheit=self.config['unit_system'] == 'us'))
+                self.update_time(age=age or 0)
+                self.update_title()
+                self.view.render()
+
+                if self.config['live_location']:
+                    self.prefetcher.schedule(self.climacell.latitude,
+                                             self.climacell.longitude)
+                return
+            except APIKeyError:
+                self.logger.error('API Key is not valid')
+                rumps.alert(title='ClimaCell API Key is not valid',
+                            message='Please make sure it is correct.')
+                if not self.set_apikey():
+                    self.handle_missing_apikey()
+            except LocationNotFoundError:
+                self.logger.error(
+                    'LocationNotFoundError: Could not load local config')
+                rumps.alert(title='Location data not found',
+                            message='Please enter another location.')
+                if not self.prefs():
+                    return
+                location = self.config['location']
+            except requests.ConnectionError:
+                self.logger.error('ConnectionError: Could not get weather')
+                self.handle_connection_error(silent=silent,
+                                             change_icon=not silent)
+                return
 
-            self.logger.info(f'Obtained weather at {location}')
-            self.temp = int(round(self.weather['temp']['value'], 0))
-            self.update_time()
-            self.update_title()
-        except APIKeyError:
-            self.logger.error('API Key is not valid')
-            rumps.alert(title='ClimaCell API Key is not valid',
-                        message='Please make sure it is correct.')
-            if not self.set_apikey():
-                self.handle_missing_apikey()
-            self.update_weather()
-        except LocationNotFoundError:
-            self.logger.error(
-                'LocationNotFoundError: Could not load local config')
-            rumps.alert(title='Location data not found',
-                        message='Please enter another location.')
-            self.prefs()
-        except requests.ConnectionError:
-            self.logger.error('ConnectionError: Could not get weather')
-            self.handle_connection_error(silent=silent, change_icon=not silent)
+        self.logger.error('Giving up on updating weather')
+
+    def get_weather(self):
+        '''
+        Get the weather at the ClimaCell location. When the location differs
+        from the last refresh, fresh cached weather from nearby is used.
+        Returns the weather and the age in seconds of cached weather, or None
+        if it was fetched.
+        '''
+        latitude = self.climacell.latitude
+        longitude = self.climacell.longitude
+        unit_system = self.climacell.unit_system
+        key = location_key(latitude, longitude)
+
+        if key != self.refreshed_at:
+            found = self.weather_cache.lookup(latitude, longitude,
+                                              unit_system)
+            if found is not None:
+                _, age, weather = found
+                self.logger.info(f'Using cached weather from nearby, {age:.0f}'
+                                 ' seconds old')
+                self.refreshed_at = key
+                return weather, age
+
+        self.budget.charge()
+        weather = self.climacell.get_weather()
+        self.weather_cache.put(latitude, longitude, unit_system, weather)
+        self.refreshed_at = key
+        return weather, None
 
     def update_title(self):
         ''' Update the app title in the menu bar'''
         self.logger.info('Updating title')
-        self.icon = None
-        emoji = get_icon(self.weather['weather_code']['value'])
-        temp = int(round(self.temp, 0))
-        self.title = f'{emoji} {temp}°'
+        emoji = get_icon(self.weather_code)
+        self.view.stage('app', **weather_state(emoji, self.temp))
 
-    def update_time(self, time=None):
-        ''' Update the last updated time in the app menu '''
+    def update_time(self, time=None, age=0):
+        '''
+        Update the last updated time in the app menu, to age seconds ago
+        '''
         self.logger.info('Updating time')
 
         if time:
             self.logger.info('Using time from param')
-            self.menu_items['last_updated_menu'].title = time
+            self.view.stage('last_updated_menu', title=time)
             return
 
-        now = datetime.datetime.now()
-        formatted = now.strftime("%b %d %H:%M:%S")
-        self.menu_items['last_updated_menu'].title = formatted
+        updated = datetime.datetime.now() - datetime.timedelta(seconds=age)
+        formatted = updated.strftime("%b %d %H:%M:%S")
+        self.view.stage('last_updated_menu', title=formatted)
 
     def update_display_units(self):
         ''' Update the units displayed in the app menu '''
         self.logger.info('Updating display units')
         if self.config['unit_system'] == 'si':
             self.logger.info('Updating to metric units')
-            self.menu_items['display_units'].title = 'Metric Units (C)'
+            self.view.stage('display_units', title='Metric Units (C)')
         else:
             self.logger.info('Updating to imperial units')
-            self.menu_items['display_units'].title = 'Imperial Units (F)'
+            self.view.stage('display_units', title='Imperial Units (F)')
 
     def change_units(self, _):
         ''' Toggle between metric and imperial units '''
@@ -349,17 +396,19 @@ class WeatherBarApp(rumps.App):
         self.logger.info('Changing ClimaCell unit system')
         self.climacell.set_unit_system(self.config['unit_system'])
 
-        if not self.icon:  # No network alert
+        if not self.view.value('app', 'icon'):  # No network alert
             self.update_title()
 
         self.update_display_units()
+        self.view.render()
         CONFIG.save(self.config)
 
     def settings(self, _):
         ''' Open the settings window '''
         self.logger.info(
             'Calling prefs from settings (Change Location button)')
-        self.prefs()
+        if self.prefs():
+            self.update_weather()
 
     def live_location_btn(self, _):
         ''' Rumps menu item wrapper for live_location '''
@@ -371,7 +420,7 @@ class WeatherBarApp(rumps.App):
         self.config['live_location'] = not self.config['live_location']
 
         self.logger.info('Changing state of live location button')
-        self.menu_items['live_location'].state = self.config['live_location']
+        self.view.stage('live_location', state=self.config['live_location'])
 
         if self.config['live_location']:
             self.config['live_location'] = True
@@ -384,127 +433,135 @@ class WeatherBarApp(rumps.App):
             self.climacell.set_location(self.config['latitude'],
                                         self.config['longitude'])
 
+        self.view.render()
         CONFIG.save(self.config)
 
         self.update_weather(silent=False)
 
     def prefs(self, current_location=None):
-        ''' Settings window '''
+        '''
+        Settings window
+
+        Reopens until a location is applied or the window is cancelled.
+        Returns True if the location was changed.
+        '''
         self.logger.info('Opened settings window')
 
         if not current_location:
             self.logger.info('Using config location as placeholder')
             current_location = self.config['location']
 
-        settings_window = rumps.Window(
-            title='Enter your location:',
-            message='Right click to paste',
-            default_text=f'{current_location}',
-            ok='Apply',
-            cancel='Cancel',
-            dimensions=(400, 40),
-        )
-        settings_window.add_button('Use Current Location')
-        response = settings_window.run()
-
-        # Cancel
-        if response.clicked == 0:
-            self.logger.info('Cancelled settings window')
-            return
+        while True:
+            settings_window = rumps.Window(
+                title='Enter your location:',
+                message='Right click to paste',
+                default_text=f'{current_location}',
+                ok='Apply',
+                cancel='Cancel',
+                dimensions=(400, 40),
+            )
+            settings_window.add_button('Use Current Location')
+            response = settings_window.run()
+
+            # Cancel
+            if response.clicked == 0:
+                self.logger.info('Cancelled settings window')
+                return False
+
+            # Use current location
+            if response.clicked == 2:
+                self.logger.info('Clicked \'Use current location\'')
+                try:
+                    self.logger.info('Trying to load local config')
+                    local_config = self.local_config()
+                    if not self.confirm_location(local_config['location']):
+                        current_location = local_config['location']
+                        continue
+
+                    self.config = local_config
+                    self.climacell.set_location(self.config['latitude'],
+                                                self.config['longitude'])
+                    location = self.config['location']
+                    self.logger.info(
+                        f'Successfully changed location to {location}')
+
+                    CONFIG.save(self.config)
+
+                    rumps.alert(title='Success!',
+                                message=('Your location has been changed to '
+                                         f'{location}.'))
+
+                    return True
+                except LocationNotFoundError:
+                    self.logger.error(
+                        'LocationNotFoundError: Could not load local config')
+                    self.handle_location_error()
+                    continue
+                except requests.ConnectionError:
+                    self.logger.error(
+                        'ConnectionError: Could not load local config')
+                    self.handle_connection_error(change_icon=True)
+                    continue
+                except:
+                    self.logger.exception(
+                        'Something went wrong whilst loading local config')
+                    rumps.alert(title='Something went wrong',
+                                message='Quitting application')
+                    self.quit_app(None)
+                    return False
+
+            if not response.text:
+                self.logger.info('Empty location input')
+                rumps.alert(title='Location cannot be empty',
+                            message='Try again')
+                continue
+
+            location = response.text
 
-        # Use current location
-        if response.clicked == 2:
-            self.logger.info('Clicked \'Use current location\'')
             try:
-                self.logger.info('Trying to load local config')
-                local_config = self.local_config()
-                if not self.confirm_location(local_config['location']):
-                    self.prefs(local_config['location'])
-                    return
-
-                self.config = local_config
-                self.climacell.set_location(self.config['latitude'],
-                                            self.config['longitude'])
-                location = self.config['location']
-                self.logger.info(
-                    f'Successfully changed location to {location}')
-
-                CONFIG.save(self.config)
-
-                rumps.alert(
-                    title='Success!',
-                    message=f'Your location has been changed to {location}.')
-
-                self.update_weather()
-            except LocationNotFoundError:
-                self.logger.error(
-                    'LocationNotFoundError: Could not load local config')
-                self.handle_location_error()
-                self.prefs(current_location)
-            except requests.ConnectionError:
+                self.logger.info(f'Trying to geocode \'{location}\'')
+                geolocation = geo.GEOCODER.geocode(location)
+            except geopy.exc.GeocoderServiceError:
                 self.logger.error(
-                    'ConnectionError: Could not load local config')
+                    f'GeocoderServiceError: Could not geocode \'{location}\'')
                 self.handle_connection_error(change_icon=True)
-                self.prefs(current_location)
+                continue
             except:
-                self.logger.exception(
-                    'Something went wrong whilst loading local config')
-                rumps.alert(title='Something went wrong',
+                self.logger.exception('Something went wrong with geopy')
+                rumps.alert(title='Soemthing went wrong with geopy',
                             message='Quitting application')
-                rumps.quit_application()
-            return
+                self.quit_app(None)
+                return False
 
-        if not response.text:
-            self.logger.info('Empty location input')
-            rumps.alert(title='Location cannot be empty', message='Try again')
-            self.prefs(current_location)
-            return
+            if geolocation is None:
+                self.logger.info('Location not found')
+                rumps.alert(title='Could not find your location',
+                            message='Try again')
+                current_location = location
+                continue
 
-        location = response.text
+            if not self.confirm_location(geolocation):
+                current_location = geolocation
+                continue
 
-        try:
-            self.logger.info(f'Trying to geocode \'{location}\'')
-            geolocation = GEOCODER.geocode(location)
-        except geopy.exc.GeocoderServiceError:
-            self.logger.error(
-                f'GeocoderServiceError: Could not geocode \'{location}\'')
-            self.handle_connection_error(change_icon=True)
-            self.prefs(current_location)
-            return
-        except:
-            self.logger.exception('Something went wrong with geopy')
-            rumps.alert(title='Soemthing went wrong with geopy',
-                        message='Quitting application')
-            rumps.quit_application()
-
-        if geolocation is None:
-            self.logger.info('Location not found')
-            rumps.alert(title='Could not find your location',
-                        message='Try again')
-            self.prefs(location)
-            return
+            latitude = geolocation.latitude
+            longitude = geolocation.longitude
 
-        if not self.confirm_location(geolocation):
-            self.prefs(geolocation)
-            return
-
-        latitude = geolocation.latitude
-        longitude = geolocation.longitude
+            self.logger.info('Updating config')
+            self.config = modify_location(self.config, location, latitude,
+                                          longitude)
 
-        self.logger.info('Updating config')
-        self.config = modify_location(self.config, location, latitude,
-                                      longitude)
+            CONFIG.save(self.config)
 
-        CONFIG.save(self.config)
+            self.logger.info('Updating ClimaCell location')
+            self.climacell.set_location(latitude, longitude)
 
-        self.logger.info('Updating ClimaCell location')
-        self.climacell.set_location(latitude, longitude)
+            self.logger.info(f'Successfully changed location to {location}')
+            rumps.alert(
+                title='Success!',
+                message=f'Your location has been changed to {location}.')
 
-        self.logger.info(f'Successfully changed location to {location}')
-        rumps.alert(title='Success!',
-                    message=f'Your location has been changed to {location}.')
-
-        self.update_weather()
+            return True
 
     def local_config(self):
         '''
@@ -512,7 +569,12 @@ class WeatherBarApp(rumps.App):
         set to the current location of the user
         '''
         self.logger.info('Obtaining location from IP-API')
-        location = get_location()
+        location = get_location(self.config.get('ip_providers'))
+
+        if self.locations.known(location['lat'], location['lon']):
+            self.logger.info('Location has been visited before')
+            return modify_location(self.config, location['location'],
+                                   location['lat'], location['lon'])
 
         try:
             self.logger.info('Trying to validate location as geopy location')
@@ -550,9 +612,9 @@ class WeatherBarApp(rumps.App):
 
         if change_icon:
             self.logger.info('Changing icon and time')
-            self.icon = 'menubar_alert_icon.ico'
-            self.menu_items['last_updated_menu'].title = 'No Connection'
-            self.title = ''
+            self.view.stage('app', **error_state())
+            self.view.stage('last_updated_menu', title='No Connection')
+            self.view.render()
 
         self.logger.info('Sending connection error alert')
         rumps.alert(title='Unable to get weather data',
@@ -567,14 +629,20 @@ class WeatherBarApp(rumps.App):
 
         if change_icon:
             self.logger.info('Changing icon and last updated menu item')
-            self.icon = 'menubar_alert_icon.ico'
-            self.menu_items['last_updated_menu'].title = 'Location not found'
-            self.title = ''
+            self.view.stage('app', **error_state())
+            self.view.stage('last_updated_menu', title='Location not found')
+            self.view.render()
 
         self.logger.info('Sending location error alert')
         rumps.alert(title='Location not found',
                     message='Could not obtain your current location')
 
+    def quit_app(self, _):
+        ''' Write out the recorded history and quit the application '''
+        self.logger.info('Writing out history before quitting')
+        HISTORY.flush()
+        rumps.quit_application()
+
     def about(self, _):
         ''' Send alert window displaying application information '''
         self.logger.info('Opening \'About\' window')
@@ -583,7 +651,8 @@ class WeatherBarApp(rumps.App):
             message=(
                 'Developed by Wai Lam Fergus Yip.\n'
                 'Weather information provided by ClimaCell API\n'
-                'Geocoding provided by GeoPy Contributors and ipapi\n'
+                'Geocoding provided by GeoPy Contributors, ipapi, ip-api and '
+                'ipwho.is\n'
                 'Icon by Catalin Fertu, reused under the CC BY License.\n\n'
                 'https://github.com/FergusYip/WeatherBarApp'))
 
@@ -592,6 +661,9 @@ class WeatherBarApp(rumps.App):
         logger = logging.getLogger('WeatherBar')
         logger.setLevel(logging.INFO)
 
+        if logger.handlers:  # Already initialised by another instance
+            return logger
+
         formatter = logging.Formatter(
             '%(asctime)s - %(levelname)s - %(message)s')
 
@@ -619,43 +691,6 @@ def to_celsius(fahrenheit):
     return (fahrenheit - 32) * 5.0 / 9.0
 
 
-def get_location():
-    ''' Get the geolocation of the user '''
-    data = get_ip_location()
-
-    city = data['city']
-    postal = data['postal']
-    region = data['region']
-    country = data['country_name']
-
-    city_postal = ' '.join([city, postal])
-
-    return {
-        'lat': data['latitude'],
-        'lon': data['longitude'],
-        'location': ', '.join([city_postal, region, country])
-    }
-
-
-def valid_geopy_location(latitude, longitude):
-    ''' Check if a coordinate is a valid geopy geolocation '''
-    return bool(GEOCODER.reverse((latitude, longitude)))
-
-
-def modify_location(config, location=None, latitude=None, longitude=None):
-    '''
-    Return a config where the location, latitude, and longitude are different
-    '''
-    modified_config = dict(config)
-    if location:
-        modified_config['location'] = location
-    if latitude:
-        modified_config['latitude'] = latitude
-    if longitude:
-        modified_config['longitude'] = longitude
-    return modified_config
-
-
 class IncompatibleConfigError(Exception):
     """
     Exception raised for errors in the config.
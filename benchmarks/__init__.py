@@ -0,0 +1,8 @@
+'''
+Offline benchmark suite for WeatherBar
+
+Run from the repository root:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.compare baseline.json results.json
+'''
@@ -0,0 +1,182 @@
+'''
+Benchmark the query throughput of the command line daemon over its socket.
+
+Starts the daemon's query server against a local fake ClimaCell that answers
+after a delay, then has several clients send queries, each over its own
+connection to the Unix socket: a mix of "current" and "weather LAT LON" for a
+set of places. Reports queries per second, query latency, and the ClimaCell
+requests and connections made, next to running "weatherbar now" once per
+query. Exits with status 1 if a query failed, a place was fetched more than
+once, or more connections were opened than the pool keeps. How failed fetches
+are answered is covered by tests/test_cli.py.
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import cli
+import climacell
+from benchmarks.fake_servers import CLIMACELL_ROUTES, FakeService
+from benchmarks.run import summarize
+from config import CONFIG_NAME, DEFAULT_CONFIG
+
+CONFIG = dict(DEFAULT_CONFIG, apikey='benchmark')
+MAX_CALLS = 10000  # Measure the daemon, not its ClimaCell budget
+
+
+def write_config(dir_path):
+    with open(os.path.join(dir_path, CONFIG_NAME), mode='w') as file:
+        json.dump(CONFIG, file)
+
+
+def client(path, queries, latencies, errors):
+    ''' Send queries one at a time over one connection '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        with connection.makefile('rb') as answers:
+            for query in queries:
+                start = time.perf_counter()
+                connection.sendall(query.encode('utf-8') + b'\n')
+                answer = json.loads(answers.readline())
+                latencies.append(time.perf_counter() - start)
+                if 'error' in answer:
+                    errors.append(answer['error'])
+
+
+def start_daemon(dir_path, max_calls=MAX_CALLS):
+    ''' Start the daemon's query server, after one poll, and return it '''
+    write_config(dir_path)
+    args = cli.parser_init().parse_args([
+        '--config-dir', dir_path, 'daemon', '--max-calls',
+        str(max_calls)
+    ])
+    config = cli.load_config(args)
+    source = cli.weather_source(args, config)
+    poller = cli.Poller(source, cli.Place(config))
+    poller.poll()
+
+    server = cli.QueryServer(os.path.join(dir_path, cli.SOCKET_NAME), source,
+                             poller)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stop_daemon(server):
+    server.shutdown()
+    server.server_close()
+    server.source.cache.close()
+
+
+def bench_daemon(service, clients, queries, places):
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as dir_path:
+        server = start_daemon(dir_path)
+        path = server.server_address
+        service.reset_counters()
+
+        workloads = [[
+            'current' if rng.random() < 0.2 else
+            'weather {} {}'.format(*rng.choice(places))
+            for _ in range(queries)
+        ] for _ in range(clients)]
+        latencies = []
+        errors = []
+        threads = [
+            threading.Thread(target=client,
+                             args=(path, workload, latencies, errors))
+            for workload in workloads
+        ]
+
+        start = time.perf_counter()
+        for client_thread in threads:
+            client_thread.start()
+        for client_thread in threads:
+            client_thread.join()
+        elapsed = time.perf_counter() - start
+
+        stats = server.answer('stats')
+        stop_daemon(server)
+
+    return {
+        'clients': clients,
+        'queries': len(latencies),
+        'errors': len(errors),
+        'queries_per_second': len(latencies) / elapsed,
+        'latency': summarize(latencies),
+        'climacell_requests': service.total_hits,
+        'climacell_connections': service.connections,
+        'stats': stats,
+    }
+
+
+def bench_one_shot(service, runs):
+    ''' Run "weatherbar now" in process once per query, with a cold cache '''
+    samples = []
+    with tempfile.TemporaryDirectory() as dir_path:
+        write_config(dir_path)
+        service.reset_counters()
+        for _ in range(runs):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                cli.main(['--config-dir', dir_path, 'now', '--max-age', '0'])
+            samples.append(time.perf_counter() - start)
+
+    return {
+        'queries': runs,
+        'queries_per_second': runs / sum(samples),
+        'latency': summarize(samples),
+        'climacell_requests': service.total_hits,
+        'climacell_connections': service.connections,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--queries',
+                        type=int,
+                        default=500,
+                        help='Queries sent by each client')
+    parser.add_argument('--places', type=int, default=24)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.05,
+                        help='Seconds the fake ClimaCell takes to answer')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    places = [(round(rng.uniform(-60, 60), 4), round(rng.uniform(-180, 180),
+                                                     4))
+              for _ in range(args.places)]
+
+    service = FakeService(CLIMACELL_ROUTES, latency=args.latency).start()
+    climacell.REALTIME_URL = f'{service.url}/v3/weather/realtime'
+    try:
+        results = {
+            'daemon': bench_daemon(service, args.clients, args.queries,
+                                   places),
+            'one_shot': bench_one_shot(service, 20),
+        }
+    finally:
+        service.stop()
+
+    print(json.dumps(results, indent=2))
+
+    daemon = results['daemon']
+    if (daemon['errors'] or daemon['climacell_requests'] > len(places)
+            or daemon['climacell_connections'] > cli.POOL_SIZE):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
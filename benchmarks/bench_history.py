@@ -0,0 +1,102 @@
+'''
+Benchmark the weather history export.
+
+Exports a synthetic history of readings taken every five minutes, reports the
+bytes per reading against one JSON object per line, the export and read
+throughput, and the peak memory at two history lengths to show that export
+runs in constant memory. Exits with status 1 if the history does not survive
+a round trip; edge cases of the format are covered by tests/test_history.py.
+'''
+
+import argparse
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import history
+
+CODES = ['clear', 'mostly_clear', 'partly_cloudy', 'cloudy', 'rain_light',
+         'rain', 'fog']
+
+
+def synthetic_readings(count, seed=0):
+    ''' Yield readings every ~5 minutes with a daily temperature cycle '''
+    rng = random.Random(seed)
+    timestamp = 1577836800
+    code = 'clear'
+    for i in range(count):
+        timestamp += 300 + rng.choice((0, 0, 0, 1, -1))
+        day = 2 * math.pi * (i % 288) / 288
+        temp = round(15 + 8 * math.sin(day) + rng.gauss(0, 0.3), 1)
+        if rng.random() < 0.05:
+            code = rng.choice(CODES)
+        yield history.Reading(timestamp, temp, code)
+
+
+def json_size(count):
+    return sum(
+        len(json.dumps(reading._asdict())) + 1
+        for reading in synthetic_readings(count))
+
+
+def bench_export(count, batch_size):
+    with tempfile.TemporaryFile() as export_file:
+        tracemalloc.start()
+        start = time.perf_counter()
+        written = history.write_readings(synthetic_readings(count),
+                                         export_file, batch_size)
+        export_seconds = time.perf_counter() - start
+        _, export_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = export_file.tell()
+
+        export_file.seek(0)
+        start = time.perf_counter()
+        round_trip = all(
+            read == expected
+            for read, expected in zip(history.read_readings(export_file),
+                                      synthetic_readings(count)))
+        read_seconds = time.perf_counter() - start
+        round_trip = round_trip and export_file.tell() == size
+
+    return {
+        'readings': written,
+        'bytes': size,
+        'bytes_per_reading': size / written,
+        'export_readings_per_second': written / export_seconds,
+        'read_readings_per_second': written / read_seconds,
+        'export_peak_bytes': export_peak,
+        'round_trip': round_trip,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readings',
+                        type=int,
+                        default=105120,
+                        help='Defaults to a year of readings')
+    parser.add_argument('--batch-size',
+                        type=int,
+                        default=history.EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    results = {
+        'export': bench_export(args.readings, args.batch_size),
+        'export_4x': bench_export(args.readings * 4, args.batch_size),
+        'json_lines_bytes_per_reading': json_size(args.readings) /
+        args.readings,
+    }
+    print(json.dumps(results, indent=2))
+
+    if not (results['export']['round_trip']
+            and results['export_4x']['round_trip']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+Benchmark IP geolocation against local stub providers.
+
+Compares a resolver with only ipapi, which fails often, against racing three
+providers with different latencies and failure rates plus one that is always
+down. Reports the success rate and latency of each, and the learned provider
+ranking. Exits with status 1 if the racing resolver does not rank the
+healthy, fast provider first and demote the one that is down. How errors
+surface is covered by tests/test_ip_api.py.
+'''
+
+import argparse
+import json
+import sys
+import time
+
+import ip_api
+from benchmarks.fake_servers import (IP_API_COM_ROUTES, IPAPI_ROUTES,
+                                     IPWHOIS_ROUTES, FakeService)
+from benchmarks.run import summarize
+from error import LocationNotFoundError
+
+
+def resolve_many(resolver, count):
+    samples = []
+    failures = 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            resolver.resolve()
+        except (LocationNotFoundError, ip_api.requests.ConnectionError):
+            failures += 1
+        samples.append(time.perf_counter() - start)
+    return {
+        'success_rate': 1 - failures / count,
+        'latency': summarize(samples),
+        'providers': resolver.summary(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--resolves', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    services = {
+        'ipapi': FakeService(IPAPI_ROUTES, latency=0.03, error_rate=0.3),
+        'ip-api': FakeService(IP_API_COM_ROUTES, latency=0.08),
+        'ipwhois': FakeService(IPWHOIS_ROUTES, latency=0.01,
+                               error_rate=0.05),
+        'down': FakeService(IPAPI_ROUTES, error_rate=1.0),
+    }
+    for service in services.values():
+        service.start()
+
+    try:
+        providers = [
+            ip_api.Provider('down', f'{services["down"].url}/json/',
+                            ip_api.parse_ipapi),
+            ip_api.Provider('ipapi', f'{services["ipapi"].url}/json/',
+                            ip_api.parse_ipapi),
+            ip_api.Provider('ip-api', f'{services["ip-api"].url}/json/',
+                            ip_api.parse_ip_api_com),
+            ip_api.Provider('ipwhois', f'{services["ipwhois"].url}/',
+                            ip_api.parse_ipwhois),
+        ]
+        results = {
+            'ipapi_only':
+            resolve_many(ip_api.Resolver(providers[1:2]), args.resolves),
+            'racing':
+            resolve_many(ip_api.Resolver(providers), args.resolves),
+        }
+    finally:
+        for service in services.values():
+            service.stop()
+
+    print(json.dumps(results, indent=2))
+
+    ranking = results['racing']['providers']
+    demoted = {
+        provider['name']
+        for provider in ranking if provider['demoted']
+    }
+    if ranking[0]['name'] != 'ipwhois' or 'down' not in demoted:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
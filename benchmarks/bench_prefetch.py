@@ -0,0 +1,154 @@
+'''
+Simulate a week of live location refreshes for someone moving between home,
+the office and the occasional cafe, with and without prefetching.
+
+Reports how many location changes found the weather already cached, the
+foreground refresh latency on those ticks, and the ClimaCell calls made,
+foreground and prefetch together, against the budget. Exits with status 1 if
+no location change was served warm with prefetching, or if any simulated hour
+made more ClimaCell calls than the budget allows.
+'''
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from benchmarks import fake_rumps
+from benchmarks.fake_servers import FakeBackends
+from benchmarks.run import new_app, point_app_at, simulate_time, summarize
+from prefetch import API_BUDGET
+from tiles import CAPACITY, cache_path
+
+PLACES = {
+    'home': ('Brooklyn', '11201', 40.6943, -73.9903),
+    'office': ('New York', '10010', 40.7410, -73.9896),
+    'cafe': ('Hoboken', '07030', 40.7439, -74.0324),
+}
+
+
+def place_at(tick, ticks_per_day):
+    ''' Where the simulated user is on a given tick '''
+    day, minute = divmod(tick * 24 * 60 // ticks_per_day, 24 * 60)
+    if day % 7 >= 5:  # Weekend
+        return 'cafe' if 10 * 60 <= minute < 13 * 60 else 'home'
+    if 9 * 60 <= minute < 17 * 60 + 30:
+        return 'office'
+    return 'home'
+
+
+def ipapi_route(current):
+    def route(_):
+        city, postal, latitude, longitude = PLACES[current['place']]
+        return 200, {
+            'city': city,
+            'region': 'New York',
+            'country_name': 'United States',
+            'postal': postal,
+            'latitude': latitude,
+            'longitude': longitude,
+        }
+
+    return route
+
+
+def simulate(app, backends, days, prefetch):
+    for path in (os.path.join(fake_rumps.SUPPORT_DIR, app.LOCATIONS_NAME),
+                 cache_path(os.path.join(fake_rumps.SUPPORT_DIR,
+                                         app.TILES_NAME), CAPACITY)):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+    current = {'place': 'home'}
+    backends.ipapi.routes = {'/json/': ipapi_route(current)}
+
+    weather_app = new_app(app, backends)
+    weather_app.config['live_location'] = True
+    weather_app.prefetcher.count = 2 if prefetch else 0
+    clock = simulate_time(weather_app)
+
+    foreground = {'calls': 0}
+    get_weather = weather_app.climacell.get_weather
+
+    def counted_get_weather(*args, **kwargs):
+        foreground['calls'] += 1
+        return get_weather(*args, **kwargs)
+
+    weather_app.climacell.get_weather = counted_get_weather
+
+    ticks_per_day = 24 * 60 * 60 // app.INTERVAL_SECONDS
+    backends.reset_counters()
+    switches = []
+    warm = 0
+    calls_per_tick = []
+    for tick in range(days * ticks_per_day):
+        place = place_at(tick, ticks_per_day)
+        moved = place != current['place']
+        current['place'] = place
+
+        clock.advance(app.INTERVAL_SECONDS)
+        calls = foreground['calls']
+        start = time.perf_counter()
+        with contextlib.suppress(Exception):
+            weather_app.update_weather_timer(None)
+        elapsed = time.perf_counter() - start
+
+        # Let queued prefetches land before the next tick
+        weather_app.prefetcher.executor.submit(lambda: None).result()
+        calls_per_tick.append(backends.climacell.total_hits -
+                              sum(calls_per_tick))
+
+        if moved:
+            switches.append(elapsed)
+            warm += foreground['calls'] == calls
+
+    weather_app.prefetcher.shutdown()
+    ticks_per_period = API_BUDGET[1] // app.INTERVAL_SECONDS
+    hits = backends.hits()
+    return {
+        'location_changes': len(switches),
+        'warm_location_changes': warm,
+        'location_change_latency': summarize(switches),
+        'climacell_calls': hits['climacell'],
+        'climacell_calls_per_day': hits['climacell'] / days,
+        'prefetch_calls': hits['climacell'] - foreground['calls'],
+        'max_calls_per_budget_period': max(
+            sum(calls_per_tick[start:start + ticks_per_period])
+            for start in range(len(calls_per_tick))),
+        'budget_calls_per_period': API_BUDGET[0],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.02,
+                        help='Seconds of latency added by the fake services')
+    args = parser.parse_args(argv)
+
+    with open(os.devnull, mode='w') as devnull:
+        with contextlib.redirect_stderr(devnull):
+            with FakeBackends(latency=args.latency) as backends:
+                app = point_app_at(backends)
+                results = {
+                    'without_prefetch':
+                    simulate(app, backends, args.days, prefetch=False),
+                    'with_prefetch':
+                    simulate(app, backends, args.days, prefetch=True),
+                }
+
+    print(json.dumps(results, indent=2))
+
+    over_budget = any(result['max_calls_per_budget_period'] >
+                      result['budget_calls_per_period']
+                      for result in results.values())
+    if results['with_prefetch']['warm_location_changes'] == 0 or over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+Benchmark the tile cache.
+
+Fills a file backed TileCache with readings at random coordinates around the
+world, then reports the cost of put and of lookups that hit (a coordinate a
+short distance from a reading) and miss. The tile math at the poles and the
+antimeridian and the cache files are covered by tests/test_tiles.py.
+'''
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+
+import tiles
+from benchmarks.run import summarize
+
+WEATHER = {'temp': {'value': 21.5}, 'weather_code': {'value': 'clear'}}
+
+
+def offset(latitude, longitude, metres, bearing):
+    ''' The coordinate a distance away along a bearing in degrees '''
+    angular = metres / tiles.EARTH_RADIUS
+    phi = math.radians(latitude)
+    theta = math.radians(bearing)
+    phi2 = math.asin(
+        math.sin(phi) * math.cos(angular) +
+        math.cos(phi) * math.sin(angular) * math.cos(theta))
+    lambda2 = math.radians(longitude) + math.atan2(
+        math.sin(theta) * math.sin(angular) * math.cos(phi),
+        math.cos(angular) - math.sin(phi) * math.sin(phi2))
+    return (math.degrees(phi2),
+            tiles.normalise_longitude(math.degrees(lambda2)))
+
+
+def bench(count, capacity):
+    rng = random.Random(1)
+    coordinates = [(rng.uniform(-85, 85), rng.uniform(-180, 180))
+                   for _ in range(count)]
+
+    with tempfile.TemporaryDirectory() as dir_path:
+        path = os.path.join(dir_path, 'tiles.cache')
+        cache = tiles.TileCache(path, capacity)
+
+        puts = []
+        for latitude, longitude in coordinates:
+            start = time.perf_counter()
+            cache.put(latitude, longitude, 'si', WEATHER)
+            puts.append(time.perf_counter() - start)
+
+        hits = []
+        found = 0
+        nearby = rng.sample(coordinates, min(10000, count))
+        for latitude, longitude in nearby:
+            query = offset(latitude, longitude, rng.uniform(0, 400),
+                           rng.uniform(0, 360))
+            start = time.perf_counter()
+            found += cache.lookup(*query, 'si') is not None
+            hits.append(time.perf_counter() - start)
+
+        misses = []
+        for _ in range(10000):
+            query = (rng.uniform(-85, 85), rng.uniform(-180, 180))
+            start = time.perf_counter()
+            cache.lookup(*query, 'si')
+            misses.append(time.perf_counter() - start)
+
+        occupied = sum(
+            1 for slot in range(capacity)
+            if cache.map[tiles.HEADER.size + slot * tiles.RECORD.size])
+
+        file_bytes = os.path.getsize(cache.path)
+        cache.close()
+
+    return {
+        'readings': count,
+        'tiles_cached': occupied,
+        'file_bytes': file_bytes,
+        'put': summarize(puts),
+        'lookup_hit': summarize(hits),
+        'lookup_miss': summarize(misses),
+        'hit_rate': found / len(hits),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readings',
+                        type=int,
+                        default=34000,
+                        help='Each reading fills a tile at every precision')
+    parser.add_argument('--capacity', type=int, default=2**18)
+    args = parser.parse_args(argv)
+
+    results = {'cache': bench(args.readings, args.capacity)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
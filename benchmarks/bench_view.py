@@ -0,0 +1,86 @@
+'''
+Benchmark menu rendering through MenuView on a large menu.
+
+Models the menu a multi-location forecast display would need (a row per
+location and hour) where each tick restages every row but only a few values
+actually change. Reports UI mutations and time per tick for MenuView against
+assigning every field directly. Exits with status 1 unless MenuView made
+exactly one mutation per row that changed.
+'''
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from benchmarks import fake_rumps
+from view import MenuView
+
+
+def forecast_rows(tick, locations, hours, rng):
+    ''' The desired title of every row; roughly one row in ten changes '''
+    rows = {}
+    for location in range(locations):
+        for hour in range(hours):
+            base = 10 + location + hour % 12
+            drift = rng.random() < 0.1
+            rows[f'{location}-{hour}'] = f'{hour:02}:00  {base + drift}°'
+        rows[f'{location}-updated'] = f'Updated at tick {tick}'
+    return rows
+
+
+def bench(locations, hours, ticks, use_view):
+    rng = random.Random(0)
+    names = forecast_rows(0, locations, hours, rng)
+    items = {name: fake_rumps.MenuItem(title='') for name in names}
+    view = MenuView(items)
+
+    fake_rumps.MUTATIONS.clear()
+    shown = {name: '' for name in names}
+    changed_rows = 0
+    start = time.perf_counter()
+    for tick in range(ticks):
+        rows = forecast_rows(tick, locations, hours, rng)
+        changed_rows += sum(rows[name] != shown[name] for name in rows)
+        shown = rows
+        if use_view:
+            for name, title in rows.items():
+                view.stage(name, title=title)
+            view.render()
+        else:
+            for name, title in rows.items():
+                items[name].title = title
+    elapsed = time.perf_counter() - start
+
+    return {
+        'menu_items': len(items),
+        'ui_mutations': sum(fake_rumps.MUTATIONS.values()),
+        'changed_rows': changed_rows,
+        'ui_mutations_per_tick': sum(fake_rumps.MUTATIONS.values()) / ticks,
+        'ms_per_tick': elapsed / ticks * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--locations', type=int, default=5)
+    parser.add_argument('--hours', type=int, default=48)
+    parser.add_argument('--ticks', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    results = {
+        'direct':
+        bench(args.locations, args.hours, args.ticks, use_view=False),
+        'menu_view':
+        bench(args.locations, args.hours, args.ticks, use_view=True),
+    }
+    print(json.dumps(results, indent=2))
+
+    view = results['menu_view']
+    if view['ui_mutations'] != view['changed_rows']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
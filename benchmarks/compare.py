@@ -0,0 +1,80 @@
+'''
+Compare two benchmark result files produced by benchmarks.run.
+
+Every numeric value present in both files is listed with its relative change.
+Exits with status 1 if any latency, memory, HTTP calls per refresh or UI
+mutations per refresh value regressed by more than the threshold, or rose
+from zero.
+'''
+
+import argparse
+import json
+import sys
+
+
+def flatten(results, prefix=''):
+    ''' Flatten nested results into {'a.b.c': number} '''
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def is_watched(name):
+    ''' Values where an increase is a regression '''
+    if name.startswith('meta.'):
+        return False
+    return (name.endswith(('_ms', '_bytes', '_kb', 'mutations_per_refresh'))
+            or '.calls_per_refresh.' in name)
+
+
+def compare(baseline, current, threshold):
+    old = flatten(baseline)
+    new = flatten(current)
+    regressions = []
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        if name.startswith('meta.'):
+            continue
+        before, after = old[name], new[name]
+        if before:
+            change = (after - before) / before
+        else:  # Any increase from nothing counts as a regression
+            change = float('inf') if after > 0 else 0.0
+        rows.append((name, before, after, change))
+        if is_watched(name) and change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=0.2,
+                        help='Relative increase counted as a regression')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    for name, before, after, change in rows:
+        flag = ' !' if name in regressions else ''
+        print(f'{name:60} {before:>14.3f} {after:>14.3f} {change:>+8.1%}{flag}')
+
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) above {args.threshold:.0%}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
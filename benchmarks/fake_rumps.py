@@ -0,0 +1,113 @@
+'''
+Headless stand-in for rumps so that app.py can be imported on Linux.
+
+Only the parts of the rumps API used by WeatherBarApp are provided. Dialogs
+return immediately with the answers set in RESPONSES, and every assignment
+that would cross into AppKit is counted in MUTATIONS.
+'''
+
+import collections
+import sys
+import tempfile
+
+RESPONSES = {
+    'alert': 1,  # OK / Yes
+    'window_clicked': 1,  # Confirm / Apply
+    'window_text': 'benchmark',
+}
+
+SUPPORT_DIR = tempfile.mkdtemp(prefix='weatherbar-bench-')
+
+separator = object()
+
+UI_FIELDS = {'title', 'icon', 'state'}
+MUTATIONS = collections.Counter()
+
+
+class UIObject:
+    def __setattr__(self, name, value):
+        if name in UI_FIELDS:
+            MUTATIONS[name] += 1
+        super().__setattr__(name, value)
+
+
+class MenuItem(UIObject):
+    def __init__(self, title='', callback=None):
+        self.title = title
+        self.state = False
+        self.callback = callback
+
+    def set_callback(self, callback):
+        self.callback = callback
+
+
+class Menu:
+    def __init__(self):
+        self.items = []
+
+    def add(self, item):
+        self.items.append(item)
+
+
+class App(UIObject):
+    def __init__(self, name, title=None, icon=None, quit_button='Quit', **_):
+        self.name = name
+        self.quit_button = quit_button
+        self.title = title
+        self.icon = icon
+        self.template = None
+        self.menu = Menu()
+
+    def run(self):
+        pass
+
+
+class Timer:
+    def __init__(self, callback, interval):
+        self.callback = callback
+        self.interval = interval
+        self.is_alive = False
+
+    def start(self):
+        self.is_alive = True
+
+    def stop(self):
+        self.is_alive = False
+
+
+class Response:
+    def __init__(self, clicked, text):
+        self.clicked = clicked
+        self.text = text
+
+
+class Window:
+    def __init__(self, title='', message='', default_text='', **_):
+        self.title = title
+        self.message = message
+        self.default_text = default_text
+
+    def add_button(self, _):
+        pass
+
+    def run(self):
+        return Response(RESPONSES['window_clicked'], RESPONSES['window_text'])
+
+
+def alert(*_, **__):
+    return RESPONSES['alert']
+
+
+def application_support(_):
+    return SUPPORT_DIR
+
+
+def quit_application(*_):
+    pass
+
+
+def install():
+    ''' Register this module as rumps and return it '''
+    module = sys.modules[__name__]
+    sys.modules['rumps'] = module
+    return module
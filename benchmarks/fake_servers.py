@@ -0,0 +1,300 @@
+'''
+Local fake ClimaCell, ipapi and Nominatim HTTP servers.
+
+Each service runs on 127.0.0.1 on a free port in a background thread, and can
+be configured with a latency (seconds, plus uniform jitter) and an error rate
+(fraction of requests answered with HTTP 503).
+'''
+
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def climacell_realtime(query):
+    ''' Fake response of the ClimaCell v3 realtime endpoint '''
+    if query.get('apikey', [''])[0] == 'invalid':
+        return 403, {'message': 'Invalid API key'}
+    unit_system = query.get('unit_system', ['si'])[0]
+    temp = random.uniform(-5, 35)
+    if unit_system == 'us':
+        temp = temp * 9.0 / 5.0 + 32
+    return 200, {
+        'lat': float(query.get('lat', [0])[0]),
+        'lon': float(query.get('lon', [0])[0]),
+        'temp': {
+            'value': temp,
+            'units': 'F' if unit_system == 'us' else 'C'
+        },
+        'weather_code': {
+            'value': random.choice(['clear', 'cloudy', 'rain', 'fog'])
+        },
+        'observation_time': {
+            'value': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        },
+    }
+
+
+def ipapi_json(_):
+    ''' Fake response of the ipapi.co JSON endpoint '''
+    return 200, {
+        'ip': '203.0.113.7',
+        'city': 'New York',
+        'region': 'New York',
+        'country_name': 'United States',
+        'postal': '10010',
+        'latitude': 40.7410861,
+        'longitude': -73.9896297241625,
+    }
+
+
+def ip_api_com_json(_):
+    ''' Fake response of the ip-api.com JSON endpoint '''
+    return 200, {
+        'status': 'success',
+        'city': 'New York',
+        'regionName': 'New York',
+        'country': 'United States',
+        'zip': '10010',
+        'lat': 40.7410861,
+        'lon': -73.9896297241625,
+    }
+
+
+def ipwhois_json(_):
+    ''' Fake response of the ipwho.is endpoint '''
+    return 200, {
+        'success': True,
+        'city': 'New York',
+        'region': 'New York',
+        'country': 'United States',
+        'postal': '10010',
+        'latitude': 40.7410861,
+        'longitude': -73.9896297241625,
+    }
+
+
+def nominatim_place(lat, lon):
+    return {
+        'place_id': 1,
+        'lat': str(lat),
+        'lon': str(lon),
+        'display_name': '175, 5th Avenue, Manhattan, New York, United States',
+        'address': {
+            'city': 'New York',
+            'country': 'United States'
+        },
+    }
+
+
+def nominatim_reverse(query):
+    ''' Fake response of the Nominatim reverse endpoint '''
+    lat = query.get('lat', ['0'])[0]
+    lon = query.get('lon', ['0'])[0]
+    return 200, nominatim_place(lat, lon)
+
+
+def nominatim_search(_):
+    ''' Fake response of the Nominatim search endpoint '''
+    return 200, [nominatim_place(40.7410861, -73.9896297241625)]
+
+
+CLIMACELL_ROUTES = {'/v3/weather/realtime': climacell_realtime}
+IPAPI_ROUTES = {'/json/': ipapi_json}
+IP_API_COM_ROUTES = {'/json/': ip_api_com_json}
+IPWHOIS_ROUTES = {'/': ipwhois_json}
+NOMINATIM_ROUTES = {
+    '/reverse': nominatim_reverse,
+    '/search': nominatim_search,
+}
+
+
+class FakeService:
+    ''' A fake HTTP service serving JSON from a table of routes '''
+    def __init__(self, routes, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.routes = routes
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.hits = {}
+        self.errors = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f'{host}:{port}'
+
+    @property
+    def url(self):
+        return f'http://{self.address}'
+
+    @property
+    def total_hits(self):
+        with self.lock:
+            return sum(self.hits.values())
+
+    def reset_counters(self):
+        with self.lock:
+            self.hits = {}
+            self.errors = 0
+            self.connections = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, path, query):
+        ''' Return the status code and body for a request '''
+        with self.lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        route = self.routes.get(path)
+        if route is None:
+            return 404, {'error': 'Not found'}
+
+        if random.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            return 503, {'error': 'Service unavailable'}
+
+        return route(query)
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with service.lock:
+                    service.connections += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body = service.respond(url.path, parse_qs(url.query))
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting, as timed out clients do
+                    self.close_connection = True
+
+            def log_message(self, *_):
+                pass
+
+        return Handler
+
+
+class FakeBackends:
+    ''' The three services WeatherBar talks to, started together '''
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.climacell = FakeService(CLIMACELL_ROUTES, latency, jitter,
+                                     error_rate)
+        self.ipapi = FakeService(IPAPI_ROUTES, latency, jitter, error_rate)
+        self.nominatim = FakeService(NOMINATIM_ROUTES, latency, jitter,
+                                     error_rate)
+
+    @property
+    def services(self):
+        return {
+            'climacell': self.climacell,
+            'ipapi': self.ipapi,
+            'nominatim': self.nominatim,
+        }
+
+    def reset_counters(self):
+        for service in self.services.values():
+            service.reset_counters()
+
+    def hits(self):
+        return {
+            name: service.total_hits
+            for name, service in self.services.items()
+        }
+
+    def __enter__(self):
+        for service in self.services.values():
+            service.start()
+        return self
+
+    def __exit__(self, *_):
+        for service in self.services.values():
+            service.stop()
+
+
+class RemoteService:
+    ''' Address of a FakeService running in another process '''
+    def __init__(self, address):
+        self.address = address
+
+    @property
+    def url(self):
+        return f'http://{self.address}'
+
+
+def _serve(conn, latency, jitter):
+    with FakeBackends(latency, jitter) as backends:
+        conn.send({
+            name: service.address
+            for name, service in backends.services.items()
+        })
+        while True:
+            error_rate = conn.recv()
+            if error_rate is None:
+                return
+            for service in backends.services.values():
+                service.error_rate = error_rate
+
+
+class SubprocessBackends:
+    '''
+    FakeBackends running in a child process, so that their threads and
+    allocations do not show up in measurements of this process.
+    Start error free; call set_error_rate once the app is running.
+    '''
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve,
+                                               args=(child_conn, latency,
+                                                     jitter),
+                                               daemon=True)
+
+    def set_error_rate(self, error_rate):
+        self.conn.send(error_rate)
+
+    def __enter__(self):
+        self.process.start()
+        addresses = self.conn.recv()
+        self.climacell = RemoteService(addresses['climacell'])
+        self.ipapi = RemoteService(addresses['ipapi'])
+        self.nominatim = RemoteService(addresses['nominatim'])
+        return self
+
+    def __exit__(self, *_):
+        self.conn.send(None)
+        self.process.join()
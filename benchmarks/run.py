@@ -0,0 +1,382 @@
+'''
+Run the WeatherBar benchmark suite against local fake services.
+
+Measures startup time, refresh latency, HTTP calls per refresh, memory
+footprint and config I/O, and prints the results as JSON. Exits with status 1
+unless a refresh in which the weather did not change made exactly one UI
+mutation, the last updated time.
+'''
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+from benchmarks import fake_rumps
+from benchmarks.fake_servers import FakeBackends, climacell_realtime
+
+fake_rumps.install()
+
+DEFAULT_CONFIG = {
+    'location': '175 5th Avenue NYC',
+    'latitude': 40.7410861,
+    'longitude': -73.9896297241625,
+    'unit_system': 'si',
+    'apikey': 'benchmark',
+    'live_location': False,
+}
+
+
+class SimulatedClock:
+    ''' A clock for the app's caches that only moves when advanced '''
+    def __init__(self, start=None):
+        self.now = time.time() if start is None else start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def simulate_time(weather_app):
+    '''
+    Give the app's caches a simulated clock, so that ticks run back to back
+    behave like ticks one refresh interval apart once the clock is advanced.
+    '''
+    clock = SimulatedClock()
+    weather_app.weather_cache.clock = clock
+    weather_app.prefetcher.budget.clock = clock
+    return clock
+
+
+def summarize(samples):
+    ''' Summarise a list of durations in seconds as milliseconds '''
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        'count': len(ordered),
+        'min_ms': ordered[0] * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True,
+                                text=True,
+                                check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def max_rss_kb():
+    ''' Peak resident set size in KiB (macOS reports bytes) '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return rss
+
+
+def write_config(config=None):
+    path = os.path.join(fake_rumps.SUPPORT_DIR, 'config.json')
+    with open(path, mode='w') as config_file:
+        json.dump(config or DEFAULT_CONFIG, config_file)
+
+
+def point_app_at(backends):
+    ''' Import the app modules and redirect them to the fake services '''
+    from geopy.geocoders import Nominatim
+
+    import app
+    import climacell
+    import geo
+    import ip_api
+
+    climacell.REALTIME_URL = (f'{backends.climacell.url}'
+                              '/v3/weather/realtime')
+    ip_api.RESOLVER = ip_api.Resolver([
+        ip_api.Provider('ipapi', f'{backends.ipapi.url}/json/',
+                        ip_api.parse_ipapi)
+    ])
+    geo.GEOCODER = Nominatim(user_agent=app.APP_NAME,
+                             domain=backends.nominatim.address,
+                             scheme='http')
+    return app
+
+
+def clear_weather_cache(app):
+    '''
+    Delete the app's tile cache, so that a new app starts cold as it did
+    before there was one, rather than with weather from an earlier app
+    '''
+    import tiles
+
+    path = tiles.cache_path(os.path.join(app.APP_SUPPORT_DIR, app.TILES_NAME),
+                            tiles.CAPACITY)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def new_app(app, backends):
+    ''' Start an app with the fake services temporarily error free '''
+    error_rates = {
+        name: service.error_rate
+        for name, service in backends.services.items()
+    }
+    for service in backends.services.values():
+        service.error_rate = 0.0
+
+    write_config()
+    clear_weather_cache(app)
+    weather_app = app.WeatherBarApp()
+
+    for name, service in backends.services.items():
+        service.error_rate = error_rates[name]
+    return weather_app
+
+
+def bench_startup(app, backends, runs):
+    samples = []
+    failures = 0
+    backends.reset_counters()
+    for _ in range(runs):
+        write_config()
+        clear_weather_cache(app)
+        start = time.perf_counter()
+        try:
+            app.WeatherBarApp()
+        except Exception:
+            failures += 1
+        samples.append(time.perf_counter() - start)
+    return {
+        'latency': summarize(samples),
+        'failures': failures,
+        'calls': backends.hits(),
+    }
+
+
+def bench_refresh(app, backends, ticks, live_location):
+    weather_app = new_app(app, backends)
+    weather_app.config['live_location'] = live_location
+    clock = simulate_time(weather_app)
+
+    backends.reset_counters()
+    fake_rumps.MUTATIONS.clear()
+    samples = []
+    failures = 0
+    for _ in range(ticks):
+        clock.advance(app.INTERVAL_SECONDS)
+        start = time.perf_counter()
+        try:
+            weather_app.update_weather()
+        except Exception:
+            failures += 1
+        samples.append(time.perf_counter() - start)
+
+    hits = backends.hits()
+    return {
+        'latency': summarize(samples),
+        'failures': failures,
+        'calls_per_refresh': {
+            name: count / ticks
+            for name, count in hits.items()
+        },
+        'ui_mutations_per_refresh':
+        sum(fake_rumps.MUTATIONS.values()) / ticks,
+        'server_errors': {
+            name: service.errors
+            for name, service in backends.services.items()
+        },
+    }
+
+
+def steady_realtime(query):
+    ''' The fake ClimaCell realtime endpoint, always with the same weather '''
+    status, body = climacell_realtime(query)
+    if status == 200:
+        body['temp']['value'] = 21.0
+        body['weather_code']['value'] = 'clear'
+    return status, body
+
+
+def check_steady_state(app, backends, ticks):
+    '''
+    Count the UI mutations of refreshes that get the same weather every
+    time, with the last updated time following the simulated clock
+    '''
+    climacell = backends.climacell
+    routes, error_rate = climacell.routes, climacell.error_rate
+    climacell.routes = {'/v3/weather/realtime': steady_realtime}
+    climacell.error_rate = 0.0
+    weather_app = new_app(app, backends)
+    clock = simulate_time(weather_app)
+    app.datetime = types.SimpleNamespace(
+        datetime=types.SimpleNamespace(
+            now=lambda: datetime.datetime.fromtimestamp(clock())),
+        timedelta=datetime.timedelta)
+
+    mutations = []
+    try:
+        # Startup may have shown weather cached by the other benchmarks
+        clock.advance(app.INTERVAL_SECONDS)
+        weather_app.update_weather()
+
+        for _ in range(ticks):
+            clock.advance(app.INTERVAL_SECONDS)
+            fake_rumps.MUTATIONS.clear()
+            weather_app.update_weather()
+            mutations.append(sum(fake_rumps.MUTATIONS.values()))
+    finally:
+        app.datetime = datetime
+        climacell.routes, climacell.error_rate = routes, error_rate
+
+    return {
+        'ticks': ticks,
+        'min_ui_mutations': min(mutations),
+        'max_ui_mutations': max(mutations),
+    }
+
+
+def bench_memory(app, backends, ticks):
+    weather_app = new_app(app, backends)
+    weather_app.config['live_location'] = True
+    clock = simulate_time(weather_app)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for _ in range(ticks):
+        clock.advance(app.INTERVAL_SECONDS)
+        try:
+            weather_app.update_weather()
+        except Exception:
+            pass
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ticks': ticks,
+        'traced_growth_bytes': current - baseline,
+        'traced_peak_bytes': peak - baseline,
+        'max_rss_kb': max_rss_kb(),
+    }
+
+
+def bench_config_io(iterations):
+    from config import Config
+
+    with tempfile.TemporaryDirectory() as dir_path:
+        config = Config(dir_path, 'config.json')
+        saves = []
+        reads = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            config.save(DEFAULT_CONFIG)
+            saves.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            config.read()
+            reads.append(time.perf_counter() - start)
+
+    return {'save': summarize(saves), 'read': summarize(reads)}
+
+
+def run(args):
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+            'params': vars(args),
+        }
+    }
+
+    with FakeBackends(latency=args.latency,
+                      jitter=args.jitter,
+                      error_rate=args.error_rate) as backends:
+        start = time.perf_counter()
+        app = point_app_at(backends)
+        results['import_seconds'] = time.perf_counter() - start
+
+        results['startup'] = bench_startup(app, backends, args.startup_runs)
+        results['refresh'] = {
+            'fixed_location':
+            bench_refresh(app, backends, args.ticks, live_location=False),
+            'live_location':
+            bench_refresh(app, backends, args.ticks, live_location=True),
+        }
+        results['memory'] = bench_memory(app, backends, args.memory_ticks)
+        results['steady_state'] = check_steady_state(app, backends, 20)
+
+    results['config_io'] = bench_config_io(args.config_iterations)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ticks', type=int, default=200)
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--memory-ticks', type=int, default=500)
+    parser.add_argument('--config-iterations', type=int, default=1000)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0.0,
+                        help='Seconds of latency added by the fake services')
+    parser.add_argument('--jitter',
+                        type=float,
+                        default=0.0,
+                        help='Maximum seconds of random extra latency')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0.0,
+                        help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--output', help='Write the JSON results to a file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # The app logs every step to stderr; keep the benchmark output readable
+    with open(os.devnull, mode='w') as devnull:
+        with contextlib.redirect_stderr(devnull):
+            results = run(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, mode='w') as output_file:
+            output_file.write(output)
+    print(output)
+
+    steady = results['steady_state']
+    if not steady['min_ui_mutations'] == steady['max_ui_mutations'] == 1:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
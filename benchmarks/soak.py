@@ -0,0 +1,109 @@
+'''
+Soak test: simulate a month of timer ticks headlessly and check that memory
+stays flat.
+
+Ticks run back to back against the fake services with injected failures, and
+every few ticks the ClimaCell API key is invalidated so the re-entry dialogs
+run as well. Traced memory (after a full garbage collection) is read from
+the app's MemoryWatchdog once per simulated day; the run fails if it keeps
+growing after the first day, or if the watchdog's RSS samples, snapshots or
+signal handlers don't report it.
+'''
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import signal
+import sys
+import tracemalloc
+
+from benchmarks.fake_servers import SubprocessBackends
+from benchmarks.run import point_app_at, simulate_time, write_config
+from memory import MAX_SAMPLES
+
+TICKS_PER_DAY = 24 * 60 * 60 // 300
+
+
+def soak(args):
+    with SubprocessBackends() as backends:
+        app = point_app_at(backends)
+        write_config()
+        weather_app = app.WeatherBarApp()
+        backends.set_error_rate(args.error_rate)
+        clock = simulate_time(weather_app)
+
+        memory = weather_app.memory
+        memory.snapshot()  # Starts tracing
+        daily = []
+        for tick in range(args.days * TICKS_PER_DAY):
+            weather_app.config['live_location'] = tick % 2 == 0
+            if tick % args.invalid_key_every == 0:
+                weather_app.climacell.set_apikey('invalid')
+
+            clock.advance(app.INTERVAL_SECONDS)
+            weather_app.update_weather_timer(None)
+
+            if (tick + 1) % TICKS_PER_DAY == 0:
+                gc.collect()
+                daily.append(memory.stats()['traced'])
+
+        growth_sites = memory.snapshot()
+        rss = memory.stats()
+        os.kill(os.getpid(), signal.SIGUSR1)  # Logs a snapshot
+        os.kill(os.getpid(), signal.SIGUSR2)  # Stops tracing
+        untraced = memory.stats()
+        with open(os.path.join(app.APP_SUPPORT_DIR, 'WeatherBar.log')) as log:
+            logged = log.read()
+
+    # The first day warms up caches, the RSS sample buffer and interned strings
+    settled = daily[1:]
+    growth = settled[-1] - settled[0] if len(settled) > 1 else 0
+    ticks = args.days * TICKS_PER_DAY
+    return {
+        'days': args.days,
+        'ticks': ticks,
+        'traced_bytes_per_day': daily,
+        'growth_bytes': growth,
+        'max_growth_bytes': args.max_growth,
+        'rss': rss,
+        'growth_sites': growth_sites,
+        'checks': {
+            'rss_sampled_every_tick':
+            rss['samples'] == min(ticks, MAX_SAMPLES)
+            and 0 < rss['min_rss'] <= rss['rss'] <= rss['max_rss'],
+            'snapshot_lists_growth':
+            bool(growth_sites)
+            and all(isinstance(line, str) for line in growth_sites),
+            'signal_logs_snapshot':
+            'Memory growth: ' in logged,
+            'signal_stops_tracing':
+            'traced' not in untraced and not tracemalloc.is_tracing(),
+        },
+        'flat': growth <= args.max_growth,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--error-rate', type=float, default=0.1)
+    parser.add_argument('--invalid-key-every', type=int, default=97)
+    parser.add_argument('--max-growth',
+                        type=int,
+                        default=256 * 1024,
+                        help='Allowed traced memory growth in bytes')
+    args = parser.parse_args(argv)
+
+    with open(os.devnull, mode='w') as devnull:
+        with contextlib.redirect_stderr(devnull):
+            results = soak(args)
+
+    print(json.dumps(results, indent=2))
+    if not results['flat'] or not all(results['checks'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,589 @@
+'''
+Command line interface for WeatherBar, for scripts, cron jobs and servers
+
+    python -m weatherbar now              Print the current weather
+    python -m weatherbar poll             Print the weather every interval
+    python -m weatherbar daemon           Poll, and answer queries on a socket
+    python -m weatherbar query [QUERY]    Send a query to a running daemon
+
+Weather is printed as JSON lines. The location, unit system and API key are
+read from the WeatherBar config unless they are given as options, and
+readings are shared with the app through its tile cache.
+
+The daemon listens on a Unix socket and answers each line it is sent with one
+JSON line:
+
+    current            The latest polled weather
+    weather LAT LON    The weather at a coordinate
+    stats              Query, cache and fetch counts, and memory usage
+    snapshot           Allocation sites that grew since the last snapshot
+    snapshot stop      Stop tracing allocations
+    ping               {"ok": true}
+
+Every client shares the daemon's cache and pooled HTTP connections, and
+clients asking about the same place at once wait for a single fetch. Its
+polls and queries share one budget of ClimaCell calls, as the app's refreshes
+and prefetches do, and are answered with an error once it is spent.
+'''
+import argparse
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+import geopy
+import requests
+from requests.adapters import HTTPAdapter
+
+import climacell
+import geo
+from climacell import APIKeyError, ClimaCell
+from config import (APP_NAME, CONFIG_NAME, DEFAULT_CONFIG, INTERVAL_SECONDS,
+                    TILES_NAME, Config)
+from error import LocationNotFoundError, QuotaExceededError
+from memory import MemoryWatchdog
+from prefetch import API_BUDGET, QuotaBudget
+from tiles import TileCache, location_key
+from view import get_icon, weather_state
+
+SOCKET_NAME = 'weatherbar.sock'
+POOL_SIZE = 16  # Connections kept open to the weather API
+QUERY_TIMEOUT = 30  # Seconds
+# Seconds to wait for another client's fetch of the same place, which makes
+# at most two requests (connect and read) limited by the ClimaCell timeout
+FETCH_WAIT = 2 * climacell.TIMEOUT + 5
+
+# Errors from getting the weather that are reported instead of raised. A
+# response without the expected fields raises KeyError, TypeError or
+# ValueError.
+WEATHER_ERRORS = (APIKeyError, LocationNotFoundError, QuotaExceededError,
+                  requests.RequestException, KeyError, TypeError, ValueError)
+
+logger = logging.getLogger('WeatherBar')
+
+
+def support_dir():
+    ''' The folder the app keeps its config and caches in '''
+    if sys.platform == 'darwin':
+        return os.path.expanduser(
+            os.path.join('~', 'Library', 'Application Support', APP_NAME))
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser(
+        os.path.join('~', '.local', 'share'))
+    return os.path.join(data_home, APP_NAME)
+
+
+def new_session(pool_size=POOL_SIZE):
+    ''' A requests.Session keeping up to pool_size connections per host '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def describe(error):
+    ''' A message for an error from getting the weather '''
+    if isinstance(error, requests.RequestException):
+        return 'Unable to get weather data'
+    if isinstance(error,
+                  (APIKeyError, LocationNotFoundError, QuotaExceededError)):
+        return error.message
+    return 'Unexpected weather data from ClimaCell'
+
+
+def timestamp(age=0.0):
+    ''' ISO 8601 UTC time of age seconds ago '''
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (now - datetime.timedelta(seconds=age)).isoformat(
+        timespec='seconds')
+
+
+def reading(location, latitude, longitude, unit_system, weather, age):
+    ''' A weather reading as a dict that can be written as JSON '''
+    weather_code = weather['weather_code']['value']
+    return {
+        'time': timestamp(age),
+        'location': location,
+        'latitude': latitude,
+        'longitude': longitude,
+        'unit_system': unit_system,
+        'temp': weather['temp']['value'],
+        'weather_code': weather_code,
+        'icon': get_icon(weather_code),
+    }
+
+
+def format_line(result, output_format):
+    if output_format == 'json':
+        return json.dumps(result, ensure_ascii=False)
+    if 'error' in result:
+        return f'Error: {result["error"]}'
+    title = weather_state(result['icon'] or '?', result['temp'])['title']
+    return f'{title} {result["location"]}'
+
+
+class WeatherSource:
+    '''
+    Weather by coordinate through a shared TileCache and HTTP session.
+    Readings younger than max_age seconds are served from the cache, and
+    concurrent requests for the same place wait for a single fetch. With a
+    budget, a fetch it has no room for raises QuotaExceededError.
+    '''
+    def __init__(self,
+                 apikey,
+                 unit_system,
+                 cache,
+                 session=None,
+                 max_age=INTERVAL_SECONDS,
+                 budget=None):
+        self.apikey = apikey
+        self.unit_system = unit_system
+        self.cache = cache
+        self.session = new_session() if session is None else session
+        self.max_age = max_age
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.hits = 0
+        self.fetches = 0
+        self.shared = 0
+        self.refused = 0
+
+    def weather(self, latitude, longitude):
+        ''' The weather at a coordinate, and its age in seconds '''
+        found = self.cache.lookup(latitude, longitude, self.unit_system)
+        if found is not None and found[1] <= self.max_age:
+            with self.lock:
+                self.hits += 1
+            return found[2], found[1]
+
+        key = location_key(latitude, longitude)
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = concurrent.futures.Future()
+                self.in_flight[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=FETCH_WAIT), 0.0
+            except concurrent.futures.TimeoutError:
+                raise requests.ConnectionError()
+
+        try:
+            weather = self.fetch(latitude, longitude)
+            future.set_result(weather)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+        return weather, 0.0
+
+    def fetch(self, latitude, longitude):
+        ''' Get the weather from ClimaCell and cache it '''
+        if self.budget is not None and not self.budget.try_acquire():
+            with self.lock:
+                self.refused += 1
+            raise QuotaExceededError()
+
+        climacell = ClimaCell(self.session)
+        climacell.set_location(float(latitude), float(longitude))
+        climacell.set_unit_system(self.unit_system)
+        climacell.set_apikey(self.apikey)
+        weather = climacell.get_weather()
+        self.cache.put(latitude, longitude, self.unit_system, weather)
+        with self.lock:
+            self.fetches += 1
+        return weather
+
+    def stats(self):
+        with self.lock:
+            return {
+                'cache_hits': self.hits,
+                'fetches': self.fetches,
+                'shared_fetches': self.shared,
+                'over_budget': self.refused,
+            }
+
+
+class Place:
+    '''
+    Where to get the weather: a coordinate, a place name, the user's IP
+    location (looked up every time when live) or the configured location
+    '''
+    def __init__(self, config, location=None, coordinates=None, live=False):
+        self.config = config
+        self.location = location
+        self.coordinates = coordinates
+        self.live = live or (config['live_location'] and not location
+                             and not coordinates)
+        self.fixed = None
+
+    def resolve(self):
+        ''' The place as (location, latitude, longitude) '''
+        if self.live:
+            location = geo.get_location(self.config.get('ip_providers'))
+            return location['location'], location['lat'], location['lon']
+        if self.fixed is None:
+            self.fixed = self.find()
+        return self.fixed
+
+    def find(self):
+        if self.coordinates:
+            latitude, longitude = self.coordinates
+            return f'{latitude}, {longitude}', latitude, longitude
+
+        if not self.location:
+            return (self.config['location'], self.config['latitude'],
+                    self.config['longitude'])
+
+        try:
+            geolocation = geo.GEOCODER.geocode(self.location)
+        except geopy.exc.GeocoderServiceError:
+            raise requests.ConnectionError()
+        if geolocation is None:
+            raise LocationNotFoundError()
+        return self.location, geolocation.latitude, geolocation.longitude
+
+
+class Poller:
+    '''
+    Gets the weather at a place and writes each result as a line to output,
+    unless it is None
+    '''
+    def __init__(self, source, place, output=None, output_format='json'):
+        self.source = source
+        self.place = place
+        self.output = output
+        self.output_format = output_format
+        self.lock = threading.Lock()
+        self.latest = None
+
+    def poll(self):
+        try:
+            location, latitude, longitude = self.place.resolve()
+            weather, age = self.source.weather(latitude, longitude)
+            result = reading(location, latitude, longitude,
+                             self.source.unit_system, weather, age)
+        except WEATHER_ERRORS as error:
+            logger.error(f'Could not get weather: {error!r}')
+            result = {'time': timestamp(), 'error': describe(error)}
+
+        with self.lock:
+            self.latest = result
+        if self.output is not None:
+            self.output.write(format_line(result, self.output_format) + '\n')
+            self.output.flush()
+        return result
+
+    def run(self, interval, stop, count=None):
+        ''' Poll every interval seconds until stopped or count polls '''
+        polls = 0
+        while not stop.is_set():
+            self.poll()
+            polls += 1
+            if count and polls >= count:
+                return
+            stop.wait(interval)
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    ''' Answers each line sent by a client with a JSON line '''
+    def handle(self):
+        self.server.count('clients')
+        for line in self.rfile:
+            query = line.decode('utf-8', 'replace').strip()
+            if not query:
+                continue
+            response = self.server.answer(query)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class QueryServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, source, poller):
+        self.source = source
+        self.poller = poller
+        self.memory = MemoryWatchdog()
+        self.lock = threading.Lock()
+        self.counts = {'clients': 0, 'queries': 0}
+        claim_socket(path)
+        super().__init__(path, QueryHandler)
+        os.chmod(path, 0o600)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def answer(self, query):
+        self.count('queries')
+        command, *args = query.split()
+
+        if command == 'ping' and not args:
+            return {'ok': True}
+        if command == 'current' and not args:
+            with self.poller.lock:
+                latest = self.poller.latest
+            return latest or {'error': 'No weather yet'}
+        if command == 'stats' and not args:
+            with self.lock:
+                stats = dict(self.counts)
+            stats.update(self.source.stats())
+            self.memory.sample()
+            stats['memory'] = self.memory.stats()
+            return stats
+        if command == 'snapshot' and not args:
+            return {'growth': self.memory.snapshot()}
+        if command == 'snapshot' and args == ['stop']:
+            self.memory.stop_tracing()
+            return {'ok': True}
+        if command == 'weather' and len(args) == 2:
+            return self.weather_at(*args)
+        return {'error': f'Unknown query: {query}'}
+
+    def weather_at(self, latitude, longitude):
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except ValueError:
+            return {'error': 'Latitude and longitude must be numbers'}
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return {'error': 'Coordinate is out of range'}
+
+        try:
+            weather, age = self.source.weather(latitude, longitude)
+            return reading(f'{latitude}, {longitude}', latitude, longitude,
+                           self.source.unit_system, weather, age)
+        except WEATHER_ERRORS as error:
+            return {'error': describe(error)}
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def claim_socket(path):
+    ''' Remove a socket left behind by a daemon that is no longer running '''
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+            return
+    raise DaemonRunningError()
+
+
+def send_query(path, query, timeout=QUERY_TIMEOUT):
+    ''' Send one query to a daemon and return its answer '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall(query.encode('utf-8') + b'\n')
+        with client.makefile('rb') as answers:
+            return json.loads(answers.readline())
+
+
+def load_config(args):
+    ''' The saved config with the options given on the command line '''
+    config = dict(DEFAULT_CONFIG)
+    try:
+        config.update(Config(args.config_dir, CONFIG_NAME).read())
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        logger.warning('Config file was incompatible, using defaults')
+
+    if args.units:
+        config['unit_system'] = args.units
+    config['apikey'] = (args.apikey or os.environ.get('CLIMACELL_APIKEY')
+                        or config['apikey'])
+    return config
+
+
+def weather_source(args, config, session=None):
+    os.makedirs(args.config_dir, exist_ok=True)
+    cache = TileCache(os.path.join(args.config_dir, TILES_NAME))
+    max_age = args.max_age
+    if max_age is None:
+        max_age = getattr(args, 'interval', INTERVAL_SECONDS)
+    budget = None
+    if getattr(args, 'max_calls', None):
+        budget = QuotaBudget(args.max_calls, API_BUDGET[1])
+    return WeatherSource(config['apikey'], config['unit_system'], cache,
+                         session, max_age, budget)
+
+
+def stop_on_signals(stop):
+    ''' Set an event on SIGINT or SIGTERM, to stop polling cleanly '''
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+
+def run_now(args, config):
+    place = Place(config, args.location, args.coordinates, args.live)
+    poller = Poller(weather_source(args, config), place, sys.stdout,
+                    args.format)
+    return 1 if 'error' in poller.poll() else 0
+
+
+def run_poll(args, config):
+    place = Place(config, args.location, args.coordinates, args.live)
+    poller = Poller(weather_source(args, config), place, sys.stdout,
+                    args.format)
+    stop = threading.Event()
+    stop_on_signals(stop)
+    poller.run(args.interval, stop, args.count)
+    return 0
+
+
+def run_daemon(args, config):
+    place = Place(config, args.location, args.coordinates, args.live)
+    source = weather_source(args, config)
+    poller = Poller(source, place, sys.stdout, args.format)
+    server = QueryServer(args.socket, source, poller)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f'Answering queries on {args.socket}')
+
+    stop = threading.Event()
+    stop_on_signals(stop)
+    try:
+        poller.run(args.interval, stop)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+def run_query(args):
+    answer = send_query(args.socket, ' '.join(args.query) or 'current')
+    print(json.dumps(answer, ensure_ascii=False))
+    return 1 if 'error' in answer else 0
+
+
+def parser_init():
+    ''' Initialise the argument parser '''
+    parser = argparse.ArgumentParser(
+        prog='weatherbar',
+        description='Current weather from ClimaCell, as JSON lines')
+    parser.add_argument('--config-dir',
+                        default=support_dir(),
+                        help='Folder of the WeatherBar config and caches')
+    parser.add_argument('-v',
+                        '--verbose',
+                        action='store_true',
+                        help='Log progress to stderr')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    weather = argparse.ArgumentParser(add_help=False)
+    where = weather.add_mutually_exclusive_group()
+    where.add_argument('--location', help='Place name to geocode')
+    where.add_argument('--coordinates',
+                       nargs=2,
+                       type=float,
+                       metavar=('LAT', 'LON'))
+    where.add_argument('--live',
+                       action='store_true',
+                       help='Locate by IP address')
+    weather.add_argument('--units', choices=['si', 'us'])
+    weather.add_argument('--apikey',
+                         help='ClimaCell API key, or set CLIMACELL_APIKEY')
+    weather.add_argument('--max-age',
+                         type=float,
+                         help='Oldest cached reading to use, in seconds. '
+                         'Defaults to the interval')
+    weather.add_argument('--format', choices=['json', 'text'], default='json')
+
+    interval = argparse.ArgumentParser(add_help=False)
+    interval.add_argument('--interval',
+                          type=float,
+                          default=INTERVAL_SECONDS,
+                          help='Seconds between polls')
+
+    socket_path = argparse.ArgumentParser(add_help=False)
+    socket_path.add_argument('--socket',
+                             help=f'Defaults to {SOCKET_NAME} in the '
+                             'config folder')
+
+    commands.add_parser('now',
+                        parents=[weather],
+                        help='Print the current weather')
+    poll = commands.add_parser('poll',
+                               parents=[weather, interval],
+                               help='Print the weather every interval')
+    poll.add_argument('--count', type=int, help='Stop after this many polls')
+    daemon = commands.add_parser(
+        'daemon',
+        parents=[weather, interval, socket_path],
+        help='Poll, and answer queries on a Unix socket')
+    daemon.add_argument('--max-calls',
+                        type=int,
+                        default=API_BUDGET[0],
+                        help='ClimaCell calls allowed an hour, shared by '
+                        'polls and queries')
+    query = commands.add_parser('query',
+                                parents=[socket_path],
+                                help='Send a query to a running daemon')
+    query.add_argument('query',
+                       nargs='*',
+                       help='current (default), weather LAT LON, stats, '
+                       'snapshot, snapshot stop or ping')
+    return parser
+
+
+def main(argv=None):
+    args = parser_init().parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    if getattr(args, 'socket', False) is None:
+        args.socket = os.path.join(args.config_dir, SOCKET_NAME)
+
+    try:
+        if args.command == 'query':
+            return run_query(args)
+
+        config = load_config(args)
+        if not config['apikey']:
+            raise APIKeyError('ClimaCell API key is missing')
+
+        if args.command == 'now':
+            return run_now(args, config)
+        if args.command == 'poll':
+            return run_poll(args, config)
+        return run_daemon(args, config)
+    except (APIKeyError, DaemonRunningError) as error:
+        print(f'weatherbar: {error.message}', file=sys.stderr)
+        return 2
+    except OSError as error:
+        print(f'weatherbar: {error}', file=sys.stderr)
+        return 1
+
+
+class DaemonRunningError(Exception):
+    """
+    Exception raised when a daemon is already answering on the socket
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message="A daemon is already running on the socket"):
+        self.message = message
+        super().__init__(self.message)
@@ -4,10 +4,17 @@ import requests
 from error import LocationNotFoundError
 
 SIGNUP_LINK = 'https://developer.climacell.co/sign-up'
+REALTIME_URL = 'https://api.climacell.co/v3/weather/realtime'
+TIMEOUT = 10  # Seconds
 
 
 class ClimaCell:
-    def __init__(self):
+    '''
+    Client for the realtime endpoint. Pass a requests.Session to reuse its
+    pooled connections across requests and across instances.
+    '''
+    def __init__(self, session=None):
+        self.session = requests if session is None else session
         self.latitude = None
         self.longitude = None
         self.unit_system = None
@@ -24,8 +31,12 @@ class ClimaCell:
             'fields': fields
         }
 
-        url = 'https://api.climacell.co/v3/weather/realtime'
-        response = requests.get(url, params=querystring)
+        try:
+            response = self.session.get(REALTIME_URL,
+                                        params=querystring,
+                                        timeout=TIMEOUT)
+        except requests.Timeout:
+            raise requests.ConnectionError()
 
         try:
             response.raise_for_status()
@@ -35,6 +46,7 @@ class ClimaCell:
                 raise APIKeyError()
             elif status_code == 404:
                 raise LocationNotFoundError()
+            raise requests.ConnectionError(response=response)
 
         return response.json()
 
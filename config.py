@@ -1,6 +1,20 @@
 import json
 import os
 
+APP_NAME = 'WeatherBar'
+INTERVAL_SECONDS = 300
+CONFIG_NAME = 'config.json'
+TILES_NAME = 'tiles.cache'
+
+DEFAULT_CONFIG = {
+    'location': '175 5th Avenue NYC',
+    'latitude': 40.7410861,
+    'longitude': -73.9896297241625,
+    'unit_system': 'si',
+    'apikey': '',
+    'live_location': False,
+}
+
 
 class Config:
     def __init__(self, dir_path, filename):
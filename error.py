@@ -9,3 +9,15 @@ class LocationNotFoundError(Exception):
     def __init__(self, message="Location was not found"):
         self.message = message
         super().__init__(self.message)
+
+
+class QuotaExceededError(Exception):
+    """
+    Exception raised when a call would go over the API call budget
+
+    Attributes:
+        message -- explanation of the error
+    """
+    def __init__(self, message="Too many weather requests, try again later"):
+        self.message = message
+        super().__init__(self.message)
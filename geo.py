@@ -0,0 +1,46 @@
+''' Module for finding and geocoding the user's location '''
+from geopy.geocoders import Nominatim
+
+from ip_api import get_ip_location
+
+GEOCODER = Nominatim(user_agent='WeatherBar')
+
+
+def get_location(providers=None):
+    '''
+    Get the geolocation of the user, optionally from the named IP
+    geolocation providers (see ip_api.PROVIDERS)
+    '''
+    data = get_ip_location(providers)
+
+    city = data['city']
+    postal = data['postal']
+    region = data['region']
+    country = data['country_name']
+
+    city_postal = ' '.join(filter(None, [city, postal]))
+
+    return {
+        'lat': data['latitude'],
+        'lon': data['longitude'],
+        'location': ', '.join([city_postal, region, country])
+    }
+
+
+def valid_geopy_location(latitude, longitude):
+    ''' Check if a coordinate is a valid geopy geolocation '''
+    return bool(GEOCODER.reverse((latitude, longitude)))
+
+
+def modify_location(config, location=None, latitude=None, longitude=None):
+    '''
+    Return a config where the location, latitude, and longitude are different
+    '''
+    modified_config = dict(config)
+    if location:
+        modified_config['location'] = location
+    if latitude:
+        modified_config['latitude'] = latitude
+    if longitude:
+        modified_config['longitude'] = longitude
+    return modified_config
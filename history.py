@@ -0,0 +1,249 @@
+'''
+Module for recording and exporting weather history
+
+Readings are stored as a sequence of self-contained batches. Each batch is a
+header (magic and payload length) followed by a zlib compressed payload that
+holds the readings column by column:
+
+    count
+    timestamps   -- first value, then deltas (seconds)
+    temps        -- first value, then deltas (tenths of a degree Celsius)
+    code table   -- the distinct weather codes in the batch
+    code ids     -- index of each reading's weather code in the code table
+
+All integers are zigzag varints, so steady intervals and slowly changing
+temperatures encode to runs of small, highly compressible bytes. Since
+batches are independent, a file can be appended to and read back one batch
+at a time in constant memory.
+'''
+import argparse
+import collections
+import itertools
+import os
+import struct
+import time
+import zlib
+
+MAGIC = b'WBH1'
+HEADER = struct.Struct('>4sI')
+EXPORT_BATCH_SIZE = 4096
+RECORD_BATCH_SIZE = 12  # One hour of readings at the default interval
+
+Reading = collections.namedtuple('Reading',
+                                 ['timestamp', 'temp', 'weather_code'])
+
+
+def reading_from_weather(weather, timestamp=None, fahrenheit=False):
+    ''' Create a reading from a ClimaCell realtime response '''
+    temp = weather['temp']['value']
+    if fahrenheit:
+        temp = (temp - 32) * 5.0 / 9.0
+    if timestamp is None:
+        timestamp = time.time()
+    return Reading(int(timestamp), round(temp, 1),
+                   weather['weather_code']['value'])
+
+
+def _write_varint(buffer, value):
+    value = (value << 1) ^ (value >> 63)  # Zigzag
+    while value > 0x7F:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), offset
+
+
+def _write_deltas(buffer, values):
+    previous = 0
+    for value in values:
+        _write_varint(buffer, value - previous)
+        previous = value
+
+
+def _read_deltas(data, offset, count):
+    values = []
+    value = 0
+    for _ in range(count):
+        delta, offset = _read_varint(data, offset)
+        value += delta
+        values.append(value)
+    return values, offset
+
+
+def encode_batch(readings):
+    ''' Encode a list of readings as a compressed batch '''
+    codes = {}
+    ids = [
+        codes.setdefault(reading.weather_code, len(codes))
+        for reading in readings
+    ]
+
+    payload = bytearray()
+    _write_varint(payload, len(readings))
+    _write_deltas(payload, (int(reading.timestamp) for reading in readings))
+    _write_deltas(payload,
+                  (int(round(reading.temp * 10)) for reading in readings))
+
+    _write_varint(payload, len(codes))
+    for code in codes:
+        encoded = code.encode('utf-8')
+        _write_varint(payload, len(encoded))
+        payload.extend(encoded)
+    for code_id in ids:
+        _write_varint(payload, code_id)
+
+    compressed = zlib.compress(bytes(payload), 9)
+    return HEADER.pack(MAGIC, len(compressed)) + compressed
+
+
+def decode_batch(batch):
+    '''
+    Decode the payload of a batch into a list of readings.
+    Raises ValueError if the payload is corrupt.
+    '''
+    try:
+        return _decode_payload(zlib.decompress(batch))
+    except (zlib.error, IndexError) as error:
+        raise ValueError('History contains a corrupt batch') from error
+
+
+def _decode_payload(data):
+    count, offset = _read_varint(data, 0)
+    timestamps, offset = _read_deltas(data, offset, count)
+    temps, offset = _read_deltas(data, offset, count)
+
+    code_count, offset = _read_varint(data, offset)
+    codes = []
+    for _ in range(code_count):
+        length, offset = _read_varint(data, offset)
+        codes.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    readings = []
+    for timestamp, temp in zip(timestamps, temps):
+        code_id, offset = _read_varint(data, offset)
+        readings.append(Reading(timestamp, temp / 10, codes[code_id]))
+    return readings
+
+
+def batched(readings, batch_size):
+    ''' Split an iterable of readings into lists of at most batch_size '''
+    iterator = iter(readings)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_readings(readings, history_file, batch_size=EXPORT_BATCH_SIZE):
+    '''
+    Write an iterable of readings to a binary file object.
+    Returns the number of readings written.
+    '''
+    written = 0
+    for batch in batched(readings, batch_size):
+        history_file.write(encode_batch(batch))
+        written += len(batch)
+    return written
+
+
+def read_batches(history_file):
+    ''' Yield the readings of a binary file object one batch at a time '''
+    while True:
+        header = history_file.read(HEADER.size)
+        if not header:
+            return
+        if len(header) < HEADER.size:
+            raise ValueError('History ends with a truncated batch header')
+
+        magic, length = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('History is not in the expected format')
+
+        payload = history_file.read(length)
+        if len(payload) < length:
+            raise ValueError('History ends with a truncated batch')
+        yield decode_batch(payload)
+
+
+def read_readings(history_file):
+    ''' Yield every reading of a binary file object '''
+    for batch in read_batches(history_file):
+        yield from batch
+
+
+def export(history_path, export_file, batch_size=EXPORT_BATCH_SIZE):
+    '''
+    Re-encode a recorded history into large batches for shipping.
+    Returns the number of readings exported.
+    '''
+    with open(history_path, mode='rb') as history_file:
+        return write_readings(read_readings(history_file), export_file,
+                              batch_size)
+
+
+class HistoryRecorder:
+    ''' Buffer readings and append them to a history file in batches '''
+    def __init__(self, dir_path, filename, batch_size=RECORD_BATCH_SIZE):
+        self.dir_path = dir_path
+        self.filename = filename
+        self.batch_size = batch_size
+        self.pending = []
+
+    @property
+    def path(self):
+        return os.path.join(self.dir_path, self.filename)
+
+    def record(self, reading):
+        ''' Add a reading, writing out the batch once it is full '''
+        self.pending.append(reading)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        ''' Append the pending readings to the history file '''
+        if not self.pending:
+            return
+        with open(self.path, mode='ab') as history_file:
+            history_file.write(encode_batch(self.pending))
+        self.pending = []
+
+    def readings(self):
+        ''' Yield every recorded reading, including pending ones '''
+        try:
+            with open(self.path, mode='rb') as history_file:
+                yield from read_readings(history_file)
+        except FileNotFoundError:
+            pass
+        yield from list(self.pending)
+
+
+def main(argv=None):
+    ''' Export a recorded history from the command line '''
+    parser = argparse.ArgumentParser(
+        description='Re-encode a WeatherBar history file into large batches')
+    parser.add_argument('history', help='Recorded history, e.g. history.bin')
+    parser.add_argument('output', help='File to export to')
+    parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    with open(args.output, mode='wb') as export_file:
+        exported = export(args.history, export_file, args.batch_size)
+    print(f'Exported {exported} readings to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,244 @@
+'''
+Module for locating the user by IP address
+
+Several IP geolocation providers are raced and the first valid answer wins.
+Providers are tried fastest first, by their recent latency, and providers
+that keep failing are demoted for a while so that they are only tried once
+the others have failed. Which providers are used, and their order before any
+latency is known, can be chosen by name (see PROVIDERS).
+'''
+import concurrent.futures
+import threading
+import time
+
 import requests
 
 from error import LocationNotFoundError
 
+IPAPI_URL = 'https://ipapi.co/json/'
+IP_API_COM_URL = 'http://ip-api.com/json/'
+IPWHOIS_URL = 'https://ipwho.is/'
 
-def get_ip_location():
-    ''' Get the geolocation of the user via a request to IP geolocation API '''
+RACE = 2  # Providers queried at once
+TIMEOUT = 5  # Seconds
+LATENCY_WEIGHT = 0.3  # Weight of the newest sample in the latency average
+MAX_FAILURES = 3  # Consecutive failures before a provider is demoted
+DEMOTION_SECONDS = 15 * 60
 
-    response = requests.get('https://ipapi.co/json/')
 
-    try:
-        response.raise_for_status()
-    except requests.HTTPError:
+def parse_ipapi(data):
+    ''' Location from an ipapi.co response '''
+    if data.get('error') is True or data.get('city') is None:
         raise LocationNotFoundError()
+    return data
 
-    data = response.json()
 
-    if data.get('error') is True or data.get('city') is None:
+def parse_ip_api_com(data):
+    ''' Location from an ip-api.com response '''
+    if data.get('status') != 'success' or not data.get('city'):
         raise LocationNotFoundError()
+    return {
+        'city': data['city'],
+        'postal': data.get('zip') or '',
+        'region': data.get('regionName') or '',
+        'country_name': data.get('country') or '',
+        'latitude': data['lat'],
+        'longitude': data['lon'],
+    }
+
+
+def parse_ipwhois(data):
+    ''' Location from an ipwho.is response '''
+    if data.get('success') is not True or not data.get('city'):
+        raise LocationNotFoundError()
+    return {
+        'city': data['city'],
+        'postal': data.get('postal') or '',
+        'region': data.get('region') or '',
+        'country_name': data.get('country') or '',
+        'latitude': data['latitude'],
+        'longitude': data['longitude'],
+    }
+
+
+class Provider:
+    ''' An IP geolocation API and how to read its response '''
+    def __init__(self, name, url, parse):
+        self.name = name
+        self.url = url
+        self.parse = parse
+
+    def locate(self, timeout=TIMEOUT):
+        '''
+        Raises requests.RequestException, including HTTPError for error
+        responses such as 429 or 503, if the provider could not answer, and
+        LocationNotFoundError if it answered without a location.
+        '''
+        response = requests.get(self.url, timeout=timeout)
+        response.raise_for_status()
+
+        try:
+            return self.parse(response.json())
+        except (ValueError, KeyError, TypeError):
+            raise LocationNotFoundError()
+
+
+class ProviderStats:
+    def __init__(self):
+        self.latency = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.demoted_until = 0
+
+
+class Resolver:
+    '''
+    Race providers for the user's location, learning which ones answer
+    fastest. Stats are updated as each attempt finishes, including attempts
+    that lost the race.
+    '''
+    def __init__(self,
+                 providers,
+                 race=RACE,
+                 timeout=TIMEOUT,
+                 clock=time.monotonic):
+        self.providers = list(providers)
+        self.race = race
+        self.timeout = timeout
+        self.clock = clock
+        self.stats = {
+            provider.name: ProviderStats()
+            for provider in self.providers
+        }
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(self.providers), 1),
+            thread_name_prefix='ip-location')
+
+    def ranked(self):
+        '''
+        Providers in the order they should be tried: healthy ones by latency
+        (untried ones first, in their listed order), then demoted ones.
+        '''
+        now = self.clock()
+        with self.lock:
+
+            def rank(indexed):
+                index, provider = indexed
+                stats = self.stats[provider.name]
+                latency = -1 if stats.latency is None else stats.latency
+                return (stats.demoted_until > now, latency, index)
+
+            return [
+                provider
+                for _, provider in sorted(enumerate(self.providers), key=rank)
+            ]
+
+    def attempt(self, provider):
+        ''' Locate with one provider and record how it went '''
+        start = self.clock()
+        try:
+            location = provider.locate(self.timeout)
+        except Exception:
+            self.record_failure(provider)
+            raise
+        self.record_success(provider, self.clock() - start)
+        return location
+
+    def record_success(self, provider, latency):
+        with self.lock:
+            stats = self.stats[provider.name]
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.demoted_until = 0
+            if stats.latency is None:
+                stats.latency = latency
+            else:
+                stats.latency += LATENCY_WEIGHT * (latency - stats.latency)
+
+    def record_failure(self, provider):
+        with self.lock:
+            stats = self.stats[provider.name]
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= MAX_FAILURES:
+                stats.demoted_until = self.clock() + DEMOTION_SECONDS
+
+    def resolve(self):
+        '''
+        Get the location from the first provider to answer validly.
+
+        Raises requests.ConnectionError if no provider could be reached, and
+        LocationNotFoundError if none of them found the location.
+        '''
+        candidates = self.ranked()
+        errors = []
+
+        for start in range(0, len(candidates), self.race):
+            futures = [
+                self.executor.submit(self.attempt, provider)
+                for provider in candidates[start:start + self.race]
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    return future.result()
+                except Exception as error:
+                    errors.append(error)
+
+        if errors and all(
+                isinstance(error, requests.RequestException)
+                for error in errors):
+            raise requests.ConnectionError()
+        raise LocationNotFoundError()
+
+    def summary(self):
+        ''' Stats of each provider, in ranked order '''
+        now = self.clock()
+        with self.lock:
+            stats = dict(self.stats)
+        return [{
+            'name': provider.name,
+            'latency': stats[provider.name].latency,
+            'successes': stats[provider.name].successes,
+            'failures': stats[provider.name].failures,
+            'demoted': stats[provider.name].demoted_until > now,
+        } for provider in self.ranked()]
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in [
+        Provider('ipapi', IPAPI_URL, parse_ipapi),
+        Provider('ip-api', IP_API_COM_URL, parse_ip_api_com),
+        Provider('ipwhois', IPWHOIS_URL, parse_ipwhois),
+    ]
+}
+
+RESOLVER = Resolver(PROVIDERS.values())
+RESOLVERS = {}  # Resolvers of other provider lists, by their names
+RESOLVERS_LOCK = threading.Lock()
+
+
+def resolver_for(names):
+    '''
+    The resolver racing the named providers, in order of preference.
+    Unknown names are ignored, and with no providers left every resolve
+    raises LocationNotFoundError.
+    '''
+    names = tuple(names)
+    with RESOLVERS_LOCK:
+        if names not in RESOLVERS:
+            RESOLVERS[names] = Resolver(
+                [PROVIDERS[name] for name in names if name in PROVIDERS])
+        return RESOLVERS[names]
+
 
-    return data
\ No newline at end of file
+def get_ip_location(providers=None):
+    '''
+    Get the geolocation of the user via a request to IP geolocation API.
+    Uses the providers named in order of preference, or else all of them.
+    '''
+    if providers is None:
+        return RESOLVER.resolve()
+    return resolver_for(providers).resolve()
@@ -0,0 +1,108 @@
+''' Module for watching the memory usage of a long running process '''
+import collections
+import os
+import signal
+import subprocess
+import time
+import tracemalloc
+
+MAX_SAMPLES = 288  # One day of samples at the default refresh interval
+
+
+def current_rss():
+    '''
+    Resident set size of this process in bytes, or None if it can't be read.
+    Read from /proc on Linux and from ps elsewhere, such as on macOS where
+    getrusage only reports the peak.
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        output = subprocess.run(['ps', '-o', 'rss=', '-p',
+                                 str(os.getpid())],
+                                capture_output=True,
+                                check=True,
+                                text=True).stdout
+        return int(output) * 1024
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+class MemoryWatchdog:
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.samples = collections.deque(maxlen=max_samples)
+        self.last_snapshot = None
+
+    def sample(self):
+        ''' Record the current RSS and return it '''
+        rss = current_rss()
+        if rss is not None:
+            self.samples.append((time.time(), rss))
+        return rss
+
+    def snapshot(self, limit=10):
+        '''
+        Take a tracemalloc snapshot and return the allocation sites that grew
+        the most since the previous snapshot.
+
+        Tracing starts on the first call, so the first call returns no growth.
+        '''
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.last_snapshot = None
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__), ))
+
+        if self.last_snapshot is None:
+            self.last_snapshot = snapshot
+            return []
+
+        stats = snapshot.compare_to(self.last_snapshot, 'lineno')
+        self.last_snapshot = snapshot
+        return [str(stat) for stat in stats[:limit]]
+
+    def stop_tracing(self):
+        ''' Stop tracemalloc and drop the stored snapshot '''
+        self.last_snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stats(self):
+        ''' Summary of the recorded RSS samples in bytes '''
+        stats = {'samples': len(self.samples)}
+        if self.samples:
+            values = [rss for _, rss in self.samples]
+            stats.update(rss=values[-1],
+                         min_rss=min(values),
+                         max_rss=max(values),
+                         growth=values[-1] - values[0],
+                         since=self.samples[0][0])
+
+        if tracemalloc.is_tracing():
+            stats['traced'], stats['traced_peak'] = \
+                tracemalloc.get_traced_memory()
+
+        return stats
+
+    def handle_signals(self, logger):
+        '''
+        Log the allocation sites that grew since the last snapshot on
+        SIGUSR1, and stop tracing on SIGUSR2.
+        '''
+        def log_snapshot(*_):
+            logger.info(f'Memory: {self.stats()}')
+            for line in self.snapshot():
+                logger.info(f'Memory growth: {line}')
+
+        def stop_tracing(*_):
+            self.stop_tracing()
+            logger.info('Memory: stopped tracing')
+
+        signal.signal(signal.SIGUSR1, log_snapshot)
+        signal.signal(signal.SIGUSR2, stop_tracing)
@@ -0,0 +1,236 @@
+'''
+Module for keeping the weather of frequently visited locations warm
+
+With live location enabled, every visited location is counted. After each
+refresh the most visited other locations are fetched on a background thread
+into a cache (see tiles.TileCache), within a quota budget, so that when the
+user arrives at one of them the weather is already there.
+'''
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from climacell import ClimaCell
+from tiles import location_key
+
+MAX_LOCATIONS = 32
+PREFETCH_LOCATIONS = 2
+# ClimaCell calls per period in seconds, foreground refreshes included. A
+# refresh every five minutes uses 12 an hour, leaving 6 for prefetching, and
+# a day stays well under the free plan's 1000 calls.
+API_BUDGET = (18, 60 * 60)
+FETCH_DEADLINE = 60  # Seconds before a stalled prefetch is abandoned
+
+logger = logging.getLogger('WeatherBar')
+
+
+class LocationHistory:
+    '''
+    Visit counts of live locations, persisted with a Config.
+    The least visited location is forgotten once max_locations is reached.
+    '''
+    def __init__(self, config, max_locations=MAX_LOCATIONS):
+        self.config = config
+        self.max_locations = max_locations
+        self.locations = {}
+        self.unsaved_visits = 0
+
+    def load(self):
+        ''' Restore the saved locations, ignoring a missing or bad file '''
+        try:
+            saved = self.config.read()
+            self.locations = {
+                location_key(place['latitude'], place['longitude'], 2):
+                place
+                for place in saved[-self.max_locations:]
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            self.locations = {}
+
+    def save(self):
+        self.config.save(list(self.locations.values()))
+        self.unsaved_visits = 0
+
+    def known(self, latitude, longitude):
+        ''' Return the saved location near a coordinate, or None '''
+        return self.locations.get(location_key(latitude, longitude, 2))
+
+    def visit(self, location, latitude, longitude):
+        ''' Count a visit, saving when a location is learned '''
+        key = location_key(latitude, longitude, 2)
+        place = self.locations.get(key)
+
+        if place is None:
+            if len(self.locations) >= self.max_locations:
+                least = min(self.locations,
+                            key=lambda k: self.locations[k]['visits'])
+                del self.locations[least]
+            self.locations[key] = {
+                'location': location,
+                'latitude': latitude,
+                'longitude': longitude,
+                'visits': 1,
+            }
+            self.save()
+            return
+
+        place['visits'] += 1
+        self.unsaved_visits += 1
+        if self.unsaved_visits >= 12:
+            self.save()
+
+    def frequent(self, count, exclude=None):
+        ''' The most visited locations, optionally excluding a coordinate '''
+        excluded = location_key(*exclude, 2) if exclude else None
+        places = sorted(self.locations.items(),
+                        key=lambda item: item[1]['visits'],
+                        reverse=True)
+        return [place for key, place in places if key != excluded][:count]
+
+
+class QuotaBudget:
+    ''' Allow at most max_calls within a sliding period in seconds '''
+    def __init__(self, max_calls, period, clock=time.time):
+        self.max_calls = max_calls
+        self.period = period
+        self.clock = clock
+        self.calls = collections.deque(maxlen=max_calls)
+        self.lock = threading.Lock()
+
+    def charge(self):
+        ''' Count a call that is made whatever the budget, e.g. a refresh '''
+        now = self.clock()
+        with self.lock:
+            self.calls.append(now)
+
+    def try_acquire(self):
+        ''' Count a call if the budget allows it, returning whether it did '''
+        now = self.clock()
+        with self.lock:
+            if (len(self.calls) == self.max_calls
+                    and now - self.calls[0] < self.period):
+                return False
+            self.calls.append(now)
+            return True
+
+
+class Prefetcher:
+    '''
+    Fetch the weather of frequently visited locations into the cache.
+
+    A single worker thread keeps prefetching in the background and out of the
+    way of foreground refreshes. Every fetch is charged to the budget, which
+    the app also charges for its own refreshes. A fetch still running after
+    FETCH_DEADLINE is abandoned along with its worker, so that one hung
+    request cannot stop prefetching.
+    '''
+    def __init__(self,
+                 climacell,
+                 cache,
+                 locations,
+                 budget=None,
+                 count=PREFETCH_LOCATIONS,
+                 max_workers=1):
+        self.climacell = climacell
+        self.cache = cache
+        self.locations = locations
+        self.budget = budget or QuotaBudget(*API_BUDGET)
+        self.count = count
+        self.max_workers = max_workers
+        self.executor = self.new_executor()
+        self.in_flight = {}  # Key to the monotonic time the fetch was queued
+        self.futures = set()  # Of the queued and running fetches
+        self.lock = threading.Lock()
+
+    def new_executor(self):
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='prefetch')
+
+    def abandon_stalled(self):
+        '''
+        Give up on the queued fetches if one has been running for longer than
+        FETCH_DEADLINE, and start a new worker for the next ones
+        '''
+        now = time.monotonic()
+        with self.lock:
+            if not any(now - queued > FETCH_DEADLINE
+                       for queued in self.in_flight.values()):
+                return
+            logger.warning('Prefetch stalled, starting a new worker')
+            self.in_flight.clear()
+            self.stop_executor()
+            self.executor = self.new_executor()
+
+    def stop_executor(self):
+        '''
+        Cancel the queued fetches and let the executor's workers exit once
+        their current fetch ends. Called with the lock held.
+        '''
+        # By hand, as shutdown only takes cancel_futures from Python 3.9
+        for future in self.futures:
+            future.cancel()
+        self.futures.clear()
+        self.executor.shutdown(wait=False)
+
+    def schedule(self, latitude, longitude):
+        '''
+        Queue fetches for the most visited locations other than the current
+        one whose cached weather is past half its time to live.
+        Returns the number of fetches queued.
+        '''
+        self.abandon_stalled()
+        unit_system = self.climacell.unit_system
+        queued = 0
+        for place in self.locations.frequent(self.count,
+                                             exclude=(latitude, longitude)):
+            key = location_key(place['latitude'], place['longitude'])
+            age = self.cache.age(place['latitude'], place['longitude'],
+                                 unit_system)
+            if age is not None and age < self.cache.ttl / 2:
+                continue
+
+            with self.lock:
+                if key in self.in_flight:
+                    continue
+                if not self.budget.try_acquire():
+                    logger.info('Prefetch budget exhausted')
+                    return queued
+                queued_at = time.monotonic()
+                self.in_flight[key] = queued_at
+                future = self.executor.submit(self.fetch, place, unit_system,
+                                              queued_at)
+                self.futures = {
+                    pending
+                    for pending in self.futures if not pending.done()
+                }
+                self.futures.add(future)
+            queued += 1
+        return queued
+
+    def fetch(self, place, unit_system, queued_at=None):
+        ''' Fetch the weather of a place into the cache '''
+        latitude = place['latitude']
+        longitude = place['longitude']
+        try:
+            climacell = ClimaCell()
+            climacell.set_location(latitude, longitude)
+            climacell.set_unit_system(unit_system)
+            climacell.set_apikey(self.climacell.apikey)
+
+            weather = climacell.get_weather()
+            self.cache.put(latitude, longitude, unit_system, weather)
+            logger.info(f'Prefetched weather at {place["location"]}')
+        except Exception:
+            logger.exception(f'Could not prefetch {place["location"]}')
+        finally:
+            key = location_key(latitude, longitude)
+            with self.lock:
+                # Unless abandoned, and perhaps queued again since
+                if self.in_flight.get(key) == queued_at:
+                    del self.in_flight[key]
+
+    def shutdown(self):
+        with self.lock:
+            self.stop_executor()
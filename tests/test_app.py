@@ -0,0 +1,75 @@
+''' The menu bar app, run headless against the fake rumps '''
+import datetime
+import logging
+import types
+
+from benchmarks import fake_rumps
+
+fake_rumps.install()
+
+import app  # Imports rumps, so only after the fake is installed
+import history
+import tiles
+
+WEATHER = {'temp': {'value': 21.5}, 'weather_code': {'value': 'clear'}}
+
+
+def bare_app():
+    ''' A WeatherBarApp that skipped __init__, and so startup '''
+    weather_app = app.WeatherBarApp.__new__(app.WeatherBarApp)
+    weather_app.logger = logging.getLogger('WeatherBar')
+    return weather_app
+
+
+class StagedView:
+    def __init__(self):
+        self.staged = {}
+
+    def stage(self, target, **fields):
+        self.staged.setdefault(target, {}).update(fields)
+
+
+def test_quit_writes_out_history(monkeypatch):
+    quits = []
+    monkeypatch.setattr(fake_rumps, 'quit_application',
+                        lambda *_: quits.append(True))
+    weather_app = bare_app()
+
+    reading = history.Reading(1577836800, -3.5, 'snow')
+    app.HISTORY.record(reading)
+    assert app.HISTORY.pending == [reading]
+
+    weather_app.quit_app(None)
+    assert quits == [True]
+    assert app.HISTORY.pending == []
+    assert reading in list(app.HISTORY.readings())
+
+
+def test_cached_weather_keeps_its_age():
+    now = [1577836800.0]
+    weather_app = bare_app()
+    weather_app.weather_cache = tiles.TileCache(clock=lambda: now[0])
+    weather_app.weather_cache.put(40.7410, -73.9896, 'si', WEATHER)
+    weather_app.refreshed_at = None
+    weather_app.climacell = types.SimpleNamespace(latitude=40.7411,
+                                                  longitude=-73.9897,
+                                                  unit_system='si')
+
+    now[0] += 600
+    assert weather_app.get_weather() == (WEATHER, 600)
+    weather_app.weather_cache.close()
+
+
+def test_last_updated_time_goes_back_by_the_age(monkeypatch):
+    now = datetime.datetime(2020, 1, 1, 12, 0, 0)
+    monkeypatch.setattr(
+        app, 'datetime',
+        types.SimpleNamespace(datetime=types.SimpleNamespace(now=lambda: now),
+                              timedelta=datetime.timedelta))
+    weather_app = bare_app()
+    weather_app.view = StagedView()
+
+    weather_app.update_time(age=600)
+    assert weather_app.view.staged['last_updated_menu'] == {
+        'title': 'Jan 01 11:50:00'
+    }
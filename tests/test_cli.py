@@ -0,0 +1,141 @@
+''' The command line daemon's answers to queries '''
+import os
+import threading
+import time
+
+import pytest
+
+import cli
+import climacell
+import prefetch
+import tiles
+from benchmarks.fake_servers import CLIMACELL_ROUTES, FakeService
+from error import QuotaExceededError
+
+
+@pytest.fixture
+def server(tmp_path):
+    ''' A daemon's query server, not yet serving on its socket '''
+    source = cli.WeatherSource('test', 'si', tiles.TileCache())
+    poller = cli.Poller(source, cli.Place(dict(cli.DEFAULT_CONFIG)))
+    server = cli.QueryServer(os.path.join(tmp_path, cli.SOCKET_NAME), source,
+                             poller)
+    yield server
+    server.memory.stop_tracing()
+    server.server_close()
+    source.cache.close()
+
+
+def test_stats_include_memory(server):
+    memory = server.answer('stats')['memory']
+    assert memory['samples'] == 1
+    assert memory['rss'] > 0
+
+
+def test_snapshot_lists_growth(server):
+    assert server.answer('snapshot') == {'growth': []}  # Starts tracing
+    growth = server.answer('snapshot')['growth']
+    assert growth and all(isinstance(line, str) for line in growth)
+    assert 'traced' in server.answer('stats')['memory']
+
+    assert server.answer('snapshot stop') == {'ok': True}
+    assert 'traced' not in server.answer('stats')['memory']
+
+
+@pytest.fixture
+def weather_service(monkeypatch):
+    service = FakeService(CLIMACELL_ROUTES).start()
+    monkeypatch.setattr(climacell, 'REALTIME_URL',
+                        f'{service.url}/v3/weather/realtime')
+    yield service
+    service.stop()
+
+
+def test_queries_are_refused_once_the_budget_is_spent(
+        server, weather_service):
+    server.source.budget = prefetch.QuotaBudget(1, 3600)
+
+    assert 'temp' in server.answer('weather 10 20')
+    assert server.answer('weather 30 40') == {
+        'error': QuotaExceededError().message
+    }
+    assert 'temp' in server.answer('weather 10 20')  # Cached
+    assert weather_service.total_hits == 1
+    assert server.answer('stats')['over_budget'] == 1
+
+
+def test_daemon_has_a_budget(tmp_path):
+    args = cli.parser_init().parse_args(
+        ['--config-dir', str(tmp_path), 'daemon'])
+    source = cli.weather_source(args, dict(cli.DEFAULT_CONFIG))
+    assert source.budget.max_calls == prefetch.API_BUDGET[0]
+    assert source.budget.period == prefetch.API_BUDGET[1]
+    source.cache.close()
+
+
+@pytest.fixture
+def serving(server):
+    ''' The query server answering on its socket '''
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def timed_query(path, query, answers):
+    start = time.perf_counter()
+    answer = cli.send_query(path, query)
+    answers.append((answer, time.perf_counter() - start))
+
+
+def test_malformed_response_is_an_error(serving, monkeypatch):
+    malformed = FakeService(
+        {'/v3/weather/realtime': lambda _: (200, {
+            'temp': {}
+        })}).start()
+    monkeypatch.setattr(climacell, 'REALTIME_URL',
+                        f'{malformed.url}/v3/weather/realtime')
+    try:
+        assert 'error' in serving.poller.poll()
+        path = serving.server_address
+        assert cli.send_query(path, 'weather 10 20') == {
+            'error': 'Unexpected weather data from ClimaCell'
+        }
+        assert cli.send_query(path, 'ping') == {'ok': True}
+    finally:
+        malformed.stop()
+
+
+@pytest.fixture
+def slow_service(monkeypatch):
+    slow = FakeService(CLIMACELL_ROUTES, latency=2.0).start()
+    monkeypatch.setattr(climacell, 'REALTIME_URL',
+                        f'{slow.url}/v3/weather/realtime')
+    yield slow
+    slow.stop()
+
+
+def test_stalled_fetch_times_out(serving, slow_service, monkeypatch):
+    monkeypatch.setattr(climacell, 'TIMEOUT', 0.2)
+    answers = []
+    timed_query(serving.server_address, 'weather 10 20', answers)
+    answer, seconds = answers[0]
+    assert 'error' in answer
+    assert seconds < 1.5
+
+
+def test_waiting_client_times_out(serving, slow_service, monkeypatch):
+    monkeypatch.setattr(cli, 'FETCH_WAIT', 0.2)
+    answers = []
+    threads = [
+        threading.Thread(target=timed_query,
+                         args=(serving.server_address, 'weather 30 40',
+                               answers)) for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    waited = [seconds for answer, seconds in answers if 'error' in answer]
+    assert waited and min(waited) < 1.5
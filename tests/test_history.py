@@ -0,0 +1,102 @@
+''' Round trips of weather history through the batch format '''
+import io
+import os
+import zlib
+
+import pytest
+
+import history
+
+COLD = [
+    history.Reading(1577836800, -0.1, 'snow'),
+    history.Reading(1577837100, -40.5, 'snow_heavy'),
+    history.Reading(1577837400, 0.0, 'fog'),
+    history.Reading(1577837700, 12.3, 'clear'),
+    history.Reading(1577837400, -7.8, 'freezing_rain'),  # Clock went back
+]
+
+
+def round_trip(readings, batch_size=history.EXPORT_BATCH_SIZE):
+    history_file = io.BytesIO()
+    history.write_readings(readings, history_file, batch_size)
+    history_file.seek(0)
+    return list(history.read_readings(history_file))
+
+
+def read_bytes(data):
+    return list(history.read_readings(io.BytesIO(data)))
+
+
+def two_batches():
+    batch = history.encode_batch(COLD)
+    return batch + batch
+
+
+def test_negative_temperatures():
+    assert round_trip(COLD) == COLD
+
+
+def test_batch_boundaries():
+    assert round_trip(COLD, batch_size=2) == COLD
+
+
+def test_empty_file():
+    assert round_trip([]) == []
+
+
+def test_fahrenheit_readings_are_stored_in_celsius():
+    weather = {'temp': {'value': 14.0}, 'weather_code': {'value': 'snow'}}
+    reading = history.reading_from_weather(weather, 0, fahrenheit=True)
+    assert round_trip([reading]) == [history.Reading(0, -10.0, 'snow')]
+
+
+def test_truncated_header():
+    data = two_batches()
+    with pytest.raises(ValueError):
+        read_bytes(data[:len(data) // 2 + 3])
+
+
+def test_truncated_batch():
+    with pytest.raises(ValueError):
+        read_bytes(two_batches()[:-1])
+
+
+def test_corrupt_batch():
+    corrupt = bytearray(two_batches())
+    corrupt[history.HEADER.size + 4] ^= 0xFF
+    with pytest.raises(ValueError):
+        read_bytes(bytes(corrupt))
+
+
+def test_malformed_payload():
+    payload = zlib.compress(b'\x0a')  # Ten readings, but no columns
+    with pytest.raises(ValueError):
+        read_bytes(history.HEADER.pack(history.MAGIC, len(payload)) + payload)
+
+
+def test_wrong_magic():
+    with pytest.raises(ValueError):
+        read_bytes(b'NOPE' + two_batches()[4:])
+
+
+def test_flush_persists_partial_batch(tmp_path):
+    recorder = history.HistoryRecorder(tmp_path, 'history.bin')
+    for reading in COLD:
+        recorder.record(reading)
+    assert not os.path.exists(recorder.path)
+
+    recorder.flush()
+    reopened = history.HistoryRecorder(tmp_path, 'history.bin')
+    assert list(reopened.readings()) == COLD
+
+
+def test_export_entry_point(tmp_path):
+    recorder = history.HistoryRecorder(tmp_path, 'history.bin')
+    for reading in COLD:
+        recorder.record(reading)
+    recorder.flush()
+
+    export_path = os.path.join(tmp_path, 'export.bin')
+    history.main([recorder.path, export_path, '--batch-size', '2'])
+    with open(export_path, mode='rb') as export_file:
+        assert list(history.read_readings(export_file)) == COLD
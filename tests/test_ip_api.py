@@ -0,0 +1,75 @@
+''' How IP geolocation errors surface, against local stub providers '''
+import pytest
+
+import ip_api
+from benchmarks.fake_servers import IPAPI_ROUTES, FakeService
+from error import LocationNotFoundError
+
+
+@pytest.fixture
+def service():
+    ''' Start FakeServices with the given routes, stopping them after '''
+    services = []
+
+    def start(routes, **options):
+        services.append(FakeService(routes, **options).start())
+        return services[-1]
+
+    yield start
+    for started in services:
+        started.stop()
+
+
+def provider(name, service):
+    return ip_api.Provider(name, f'{service.url}/json/', ip_api.parse_ipapi)
+
+
+def test_all_down_raises_connection_error(service):
+    down = service(IPAPI_ROUTES, error_rate=1.0)
+    limited = service({'/json/': lambda _: (429, {})})
+    resolver = ip_api.Resolver(
+        [provider('down', down),
+         provider('limited', limited)])
+    with pytest.raises(ip_api.requests.ConnectionError):
+        resolver.resolve()
+
+
+def test_no_location_raises_location_not_found(service):
+    nowhere = service({
+        '/json/': lambda _: (200, {
+            'error': True,
+            'reason': 'Reserved IP Address'
+        })
+    })
+    down = service(IPAPI_ROUTES, error_rate=1.0)
+    resolver = ip_api.Resolver(
+        [provider('nowhere', nowhere),
+         provider('down', down)])
+    with pytest.raises(LocationNotFoundError):
+        resolver.resolve()
+
+
+def test_healthy_provider_answers(service):
+    down = service(IPAPI_ROUTES, error_rate=1.0)
+    healthy = service(IPAPI_ROUTES)
+    resolver = ip_api.Resolver(
+        [provider('down', down),
+         provider('healthy', healthy)])
+    assert 'latitude' in resolver.resolve()
+
+
+def test_providers_from_a_generator():
+    resolver = ip_api.Resolver(
+        provider for provider in ip_api.PROVIDERS.values())
+    assert len(resolver.summary()) == len(ip_api.PROVIDERS)
+
+
+def test_providers_chosen_by_name():
+    chosen = ip_api.resolver_for(['ipwhois', 'unknown', 'ipapi'])
+    assert [provider.name
+            for provider in chosen.providers] == ['ipwhois', 'ipapi']
+
+
+def test_no_providers_raises_location_not_found():
+    with pytest.raises(LocationNotFoundError):
+        ip_api.resolver_for([]).resolve()
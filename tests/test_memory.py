@@ -0,0 +1,76 @@
+''' Memory usage reported by the MemoryWatchdog '''
+import builtins
+import logging
+import os
+import signal
+import tracemalloc
+
+import memory
+
+
+def without_proc(monkeypatch):
+    ''' Make /proc unreadable, as on macOS '''
+    real_open = builtins.open
+
+    def proc_missing(path, *args, **kwargs):
+        if str(path).startswith('/proc/'):
+            raise FileNotFoundError(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', proc_missing)
+
+
+def test_rss_is_current_without_proc(monkeypatch):
+    without_proc(monkeypatch)
+    before = memory.current_rss()
+    held = bytearray(64 * 1024 * 1024)
+    held[::4096] = b'x' * len(held[::4096])  # Touch every page
+    during = memory.current_rss()
+    del held
+    after = memory.current_rss()
+
+    assert during - before > 32 * 1024 * 1024
+    assert after < during  # A peak would never go back down
+
+
+def test_unreadable_rss_is_not_sampled(monkeypatch):
+    monkeypatch.setattr(memory, 'current_rss', lambda: None)
+    watchdog = memory.MemoryWatchdog()
+    assert watchdog.sample() is None
+    assert watchdog.stats() == {'samples': 0}
+
+
+def test_snapshot_lists_growth():
+    watchdog = memory.MemoryWatchdog()
+    assert watchdog.snapshot() == []  # Starts tracing
+    held = [str(number) for number in range(10000)]
+    growth = watchdog.snapshot()
+    assert growth and all(isinstance(line, str) for line in growth)
+    assert 'traced' in watchdog.stats()
+
+    watchdog.stop_tracing()
+    assert 'traced' not in watchdog.stats()
+    del held
+
+
+def test_signals_log_snapshot_and_stop_tracing(caplog):
+    handlers = {
+        signum: signal.getsignal(signum)
+        for signum in (signal.SIGUSR1, signal.SIGUSR2)
+    }
+    watchdog = memory.MemoryWatchdog()
+    watchdog.sample()
+    try:
+        watchdog.handle_signals(logging.getLogger('WeatherBar'))
+        with caplog.at_level(logging.INFO, logger='WeatherBar'):
+            os.kill(os.getpid(), signal.SIGUSR1)  # Starts tracing
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert tracemalloc.is_tracing()
+            os.kill(os.getpid(), signal.SIGUSR2)
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    assert not tracemalloc.is_tracing()
+    assert 'Memory growth: ' in caplog.text
+    assert "'samples': 1" in caplog.text
@@ -0,0 +1,52 @@
+''' Prefetching the weather of frequently visited locations '''
+import concurrent.futures
+import threading
+import types
+
+import prefetch
+import tiles
+from config import Config
+
+
+def test_stalled_prefetch_is_abandoned_without_cancel_futures(
+        tmp_path, monkeypatch):
+    def shutdown(executor, wait=True):  # As on Python 3.8
+        shutdown_without_cancel(executor, wait)
+
+    shutdown_without_cancel = concurrent.futures.ThreadPoolExecutor.shutdown
+    monkeypatch.setattr(concurrent.futures.ThreadPoolExecutor, 'shutdown',
+                        shutdown)
+
+    locations = prefetch.LocationHistory(Config(tmp_path, 'locations.json'))
+    for number in range(4):
+        for _ in range(5 - number):
+            locations.visit(f'Place {number}', 10.0 * number, 20.0)
+
+    climacell = types.SimpleNamespace(unit_system='si', apikey='test')
+    prefetcher = prefetch.Prefetcher(climacell,
+                                     tiles.TileCache(),
+                                     locations,
+                                     prefetch.QuotaBudget(100, 3600),
+                                     count=3)
+    release = threading.Event()
+    fetched = []
+
+    def fetch(place, unit_system, queued_at=None):
+        fetched.append(place['location'])
+        release.wait(5)
+
+    prefetcher.fetch = fetch
+    try:
+        assert prefetcher.schedule(0.0, 20.0) == 3
+        stalled = set(prefetcher.futures)
+        with prefetcher.lock:
+            for key in prefetcher.in_flight:
+                prefetcher.in_flight[key] -= prefetch.FETCH_DEADLINE + 1
+
+        assert prefetcher.schedule(0.0, 20.0) == 3
+        assert sum(future.cancelled() for future in stalled) == 2
+        assert prefetcher.futures.isdisjoint(stalled)
+    finally:
+        release.set()
+        prefetcher.shutdown()
+        prefetcher.cache.close()
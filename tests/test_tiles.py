@@ -0,0 +1,127 @@
+''' Tile math at the poles and the antimeridian, and tile cache files '''
+import multiprocessing
+import os
+import random
+
+import pytest
+
+import tiles
+from benchmarks.bench_tiles import WEATHER, offset
+
+EDGES = [(90.0, 0.0), (-90.0, 0.0), (0.0, 180.0), (0.0, -180.0),
+         (89.9999, 179.9999)]
+
+
+def test_encoded_tile_contains_coordinate():
+    rng = random.Random(0)
+    coordinates = EDGES + [(rng.uniform(-90, 90), rng.uniform(-180, 180))
+                           for _ in range(1000)]
+    for latitude, longitude in coordinates:
+        south, north, west, east = tiles.decode(
+            tiles.encode(latitude, longitude, 7))
+        longitude = tiles.normalise_longitude(longitude)
+        assert south <= latitude <= north, (latitude, longitude)
+        assert west <= longitude <= east, (latitude, longitude)
+
+
+def test_antimeridian_tiles_are_neighbours():
+    assert tiles.encode(0.0, -179.9999, 6) in tiles.covering(
+        0.0, 179.9999, 6, 500)
+
+
+def test_tiles_across_the_pole_are_neighbours():
+    assert tiles.encode(89.99, 10.0, 5) in tiles.covering(
+        89.99, -170.0, 5, 3000)
+
+
+@pytest.mark.parametrize('stored, query', [
+    ((10.0, -179.9995), (10.0, 179.9995)),
+    ((89.999, 10.0), (89.999, -170.0)),
+    ((-89.999, 45.0), (-89.999, -135.0)),
+    ((40.7410, -73.9896), offset(40.7410, -73.9896, 400, 45)),
+],
+                         ids=[
+                             'across_antimeridian', 'across_north_pole',
+                             'across_south_pole', 'nearby'
+                         ])
+def test_lookup(stored, query):
+    cache = tiles.TileCache()
+    cache.put(*stored, 'si', WEATHER)
+    found = cache.lookup(*query, 'si')
+    cache.close()
+    assert found is not None and found[2] == WEATHER
+
+
+def test_outside_tolerance_misses():
+    cache = tiles.TileCache()
+    cache.put(40.7410, -73.9896, 'si', WEATHER)
+    assert cache.lookup(*offset(40.7410, -73.9896, 700, 90), 'si') is None
+    cache.close()
+
+
+def test_unit_systems_are_separate():
+    cache = tiles.TileCache()
+    cache.put(40.7410, -73.9896, 'si', WEATHER)
+    assert cache.lookup(40.7410, -73.9896, 'us') is None
+    cache.close()
+
+
+def test_capacities_use_separate_files(tmp_path):
+    path = os.path.join(tmp_path, 'tiles.cache')
+    cache = tiles.TileCache(path, 64)
+    cache.put(40.7410, -73.9896, 'si', WEATHER)
+    size = os.path.getsize(cache.path)
+
+    other = tiles.TileCache(path, 128)
+    assert other.path != cache.path
+    assert os.path.getsize(cache.path) == size
+    other.close()
+    cache.close()
+
+
+def test_reopen_keeps_readings(tmp_path):
+    path = os.path.join(tmp_path, 'tiles.cache')
+    cache = tiles.TileCache(path, 64)
+    cache.put(40.7410, -73.9896, 'si', WEATHER)
+    cache.close()
+
+    reopened = tiles.TileCache(path, 64)
+    assert reopened.get(40.7410, -73.9896, 'si') == WEATHER
+    reopened.close()
+
+
+def test_unknown_file_is_cleared(tmp_path):
+    path = os.path.join(tmp_path, 'tiles.cache')
+    cache = tiles.TileCache(path, 64)
+    cache.put(40.7410, -73.9896, 'si', WEATHER)
+    size = os.path.getsize(cache.path)
+    cache.close()
+
+    with open(tiles.cache_path(path, 64), mode='r+b') as cache_file:
+        cache_file.write(b'JUNK')
+    cleared = tiles.TileCache(path, 64)
+    assert cleared.get(40.7410, -73.9896, 'si') is None
+    assert os.path.getsize(cleared.path) == size
+    cleared.close()
+
+
+def lookup_in_child(path, capacity, coordinate, queue):
+    cache = tiles.TileCache(path, capacity)
+    queue.put(cache.lookup(*coordinate, 'si') is not None)
+    cache.close()
+
+
+def test_shared_with_other_process(tmp_path):
+    path = os.path.join(tmp_path, 'tiles.cache')
+    cache = tiles.TileCache(path, 64)
+    cache.put(40.7410, -73.9896, 'si', WEATHER)
+
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=lookup_in_child,
+                                    args=(path, 64, (40.7410, -73.9896),
+                                          queue))
+    child.start()
+    shared = queue.get(timeout=30)
+    child.join()
+    cache.close()
+    assert shared
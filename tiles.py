@@ -0,0 +1,330 @@
+'''
+Module for caching weather by map tile, so that nearby locations share it
+
+Coordinates are bucketed into geohash tiles at several precisions. A reading
+is stored in the tile containing it at every precision, and a lookup searches
+the tiles around a coordinate for the closest fresh reading within a distance
+tolerance: the tile itself at the fine precisions, and the tiles covering the
+tolerance at the first precision whose tiles are at least that large.
+
+Tiles live in an open addressing hash table in a memory mapped file, so every
+process on the machine that opens the same file shares the cache. Each slot
+holds the tile key and one reading; when all the slots a key can probe are
+taken, the oldest reading is replaced, which keeps the file a fixed size.
+Each capacity has a file of its own, as shrinking a file that another process
+has mapped would crash that process with SIGBUS.
+'''
+import contextlib
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISIONS = (7, 6, 5)  # About 150 m, 1.2 km and 4.9 km wide at the equator
+TOLERANCE = 500  # Metres
+CACHE_TTL = 900  # Three refresh intervals
+CAPACITY = 2**14  # Slots
+PROBES = 8
+MAX_SPAN = 8  # Tiles searched either side of a coordinate
+EARTH_RADIUS = 6371008.8  # Metres
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+MAGIC = b'WBT1'
+HEADER = struct.Struct('<4sI8x')
+# Key (unit system and geohash), timestamp, latitude, longitude, temp, code
+RECORD = struct.Struct('<16sdddd24s')
+
+
+def cache_path(path, capacity):
+    ''' The file of a cache of a capacity, e.g. tiles-16384.cache '''
+    root, extension = os.path.splitext(path)
+    return f'{root}-{capacity}{extension}'
+
+
+def location_key(latitude, longitude, precision=3):
+    ''' Round a coordinate so that nearby readings share a key '''
+    return (round(latitude, precision), round(longitude, precision))
+
+
+def normalise_longitude(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def encode(latitude, longitude, precision):
+    ''' Geohash of a coordinate '''
+    latitude = min(max(latitude, -90.0), 90.0)
+    longitude = normalise_longitude(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude,
+                                                             lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits = bits * 2
+            bounds[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def decode(geohash):
+    ''' Bounding box of a geohash as (south, north, west, east) '''
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if bits >> shift & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def tile_size(precision):
+    ''' Height and width of the tiles of a precision in degrees '''
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def distance(lat1, lon1, lat2, lon2):
+    ''' Great circle distance between two coordinates in metres '''
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (math.sin(d_phi / 2)**2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2)**2)
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def spans(latitude, precision, radius):
+    ''' Tiles needed either side of a coordinate to cover a radius '''
+    height, width = tile_size(precision)
+    lat_span = math.ceil(radius / (height * METRES_PER_DEGREE))
+    metres_wide = width * METRES_PER_DEGREE * math.cos(math.radians(latitude))
+    if metres_wide <= 0:
+        return lat_span, MAX_SPAN
+    return lat_span, min(math.ceil(radius / metres_wide), MAX_SPAN)
+
+
+def covering(latitude, longitude, precision, radius):
+    '''
+    Geohashes of the tiles around a coordinate that cover a radius in metres.
+
+    Longitudes wrap around the antimeridian, and rows past a pole continue on
+    the opposite side of the globe. Near the poles, where tiles become very
+    narrow, at most MAX_SPAN tiles are searched either side.
+    '''
+    height, width = tile_size(precision)
+    south, north, west, east = decode(encode(latitude, longitude, precision))
+    centre_lat = (south + north) / 2
+    centre_lon = (west + east) / 2
+    lat_span, lon_span = spans(latitude, precision, radius)
+
+    tiles = []
+    for dy in range(-lat_span, lat_span + 1):
+        row_lat = centre_lat + dy * height
+        row_lon = centre_lon
+        if row_lat > 90:
+            row_lat, row_lon = 180 - row_lat, row_lon + 180
+        elif row_lat < -90:
+            row_lat, row_lon = -180 - row_lat, row_lon + 180
+
+        for dx in range(-lon_span, lon_span + 1):
+            geohash = encode(row_lat, row_lon + dx * width, precision)
+            if geohash not in tiles:
+                tiles.append(geohash)
+    return tiles
+
+
+def search_plan(latitude, longitude, tolerance):
+    '''
+    The tiles to probe for a coordinate: the tile itself at each precision
+    finer than the tolerance, then the tiles covering the tolerance at the
+    first precision (or the coarsest) whose tiles are as large as it.
+    '''
+    plan = []
+    for precision in PRECISIONS:
+        height, width = tile_size(precision)
+        metres_wide = (width * METRES_PER_DEGREE *
+                       math.cos(math.radians(latitude)))
+        large_enough = min(height * METRES_PER_DEGREE,
+                           metres_wide) >= tolerance
+        if large_enough or precision == PRECISIONS[-1]:
+            plan.extend(covering(latitude, longitude, precision, tolerance))
+            return plan
+        plan.append(encode(latitude, longitude, precision))
+    return plan
+
+
+class TileCache:
+    '''
+    Weather readings by tile in a memory mapped file, or in anonymous memory
+    if no path is given. The capacity is added to the file name (see
+    cache_path). Provides the same get, age and put interface as the
+    prefetcher expects, keyed by coordinate and unit system.
+    '''
+    def __init__(self,
+                 path=None,
+                 capacity=CAPACITY,
+                 ttl=CACHE_TTL,
+                 tolerance=TOLERANCE,
+                 clock=time.time):
+        self.path = None if path is None else cache_path(path, capacity)
+        self.capacity = capacity
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.fd = None
+
+        size = HEADER.size + capacity * RECORD.size
+        if path is None:
+            self.map = mmap.mmap(-1, size)
+            HEADER.pack_into(self.map, 0, MAGIC, capacity)
+            return
+
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self.fd, HEADER.size, 0)
+            # Only ever grown, never truncated, as it may be mapped elsewhere
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+            if header != HEADER.pack(MAGIC, capacity):
+                if header.strip(b'\0'):  # Not a cache: clear it in place
+                    os.pwrite(self.fd, bytes(size), 0)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, capacity), 0)
+            self.map = mmap.mmap(self.fd, size)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def locked(self, exclusive=False):
+        ''' Lock against other threads and, for files, other processes '''
+        with self.lock:
+            if self.fd is None:
+                yield
+                return
+            fcntl.flock(self.fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self.map.close()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _slots(self, key):
+        start = zlib.crc32(key) % self.capacity
+        for probe in range(PROBES):
+            yield HEADER.size + (start + probe) % self.capacity * RECORD.size
+
+    def _read(self, key):
+        for offset in self._slots(key):
+            record = RECORD.unpack_from(self.map, offset)
+            if record[0] == key:
+                return record
+            if not record[0].strip(b'\0'):
+                return None
+        return None
+
+    def _write(self, key, *values):
+        oldest = None
+        for offset in self._slots(key):
+            slot_key, timestamp = RECORD.unpack_from(self.map, offset)[:2]
+            if slot_key == key or not slot_key.strip(b'\0'):
+                oldest = offset
+                break
+            if oldest is None or timestamp < oldest_timestamp:
+                oldest, oldest_timestamp = offset, timestamp
+        RECORD.pack_into(self.map, oldest, key, *values)
+
+    @staticmethod
+    def _key(geohash, unit_system):
+        key = f'{unit_system[:1]}{geohash}'.encode('ascii')
+        return key.ljust(16, b'\0')  # As the key is unpacked from a record
+
+    def lookup(self, latitude, longitude, unit_system, tolerance=None):
+        '''
+        The closest fresh reading within the tolerance in metres, as
+        (distance, age, weather), or None.
+        '''
+        if tolerance is None:
+            tolerance = self.tolerance
+        now = self.clock()
+
+        best = None
+        with self.locked():
+            for geohash in search_plan(latitude, longitude, tolerance):
+                record = self._read(self._key(geohash, unit_system))
+                if record is None:
+                    continue
+                _, timestamp, lat, lon, temp, code = record
+                age = now - timestamp
+                if age > self.ttl:
+                    continue
+                metres = distance(latitude, longitude, lat, lon)
+                if metres <= tolerance and (best is None or metres < best[0]):
+                    best = (metres, age, temp, code)
+
+        if best is None:
+            return None
+        metres, age, temp, code = best
+        weather = {
+            'temp': {
+                'value': temp
+            },
+            'weather_code': {
+                'value': code.rstrip(b'\0').decode('utf-8')
+            },
+        }
+        return metres, age, weather
+
+    def get(self, latitude, longitude, unit_system):
+        ''' Fresh weather near a coordinate, or None '''
+        found = self.lookup(latitude, longitude, unit_system)
+        return None if found is None else found[2]
+
+    def age(self, latitude, longitude, unit_system):
+        ''' Seconds since the nearest fresh reading was taken, or None '''
+        found = self.lookup(latitude, longitude, unit_system)
+        return None if found is None else found[1]
+
+    def put(self, latitude, longitude, unit_system, weather):
+        ''' Store the temperature and weather code of a reading '''
+        values = (self.clock(), latitude, longitude,
+                  float(weather['temp']['value']),
+                  weather['weather_code']['value'].encode('utf-8'))
+        with self.locked(exclusive=True):
+            for precision in PRECISIONS:
+                geohash = encode(latitude, longitude, precision)
+                self._write(self._key(geohash, unit_system), *values)
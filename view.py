@@ -0,0 +1,96 @@
+'''
+Module for pushing menu bar state to the UI only when it changes
+
+Every assignment to a rumps App or MenuItem attribute crosses into AppKit, so
+the app stages the state it wants and the MenuView applies just the fields
+that differ from what was last rendered, in one batch.
+'''
+
+ALERT_ICON = 'menubar_alert_icon.ico'
+
+WEATHER_ICONS = {
+    '☀️': ['clear'],
+    '⛅': ['partly_cloudy'],
+    '⛈': ['tstorm'],
+    '🌤': ['mostly_clear'],
+    '🌥': ['mostly_cloudy'],
+    '☁️': ['cloudy'],
+    '🌧': ['rain_heavy', 'rain', 'rain_light', 'drizzle'],
+    '🌨': [
+        'snow_heavy',
+        'snow',
+        'snow_light',
+        'flurries',
+        'freezing_rain_heavy',
+        'freezing_rain',
+        'freezing_rain_light',
+        'freezing_drizzle',
+        'ice_pellets_heavy',
+        'ice_pellets',
+        'ice_pellets_light',
+    ],
+    '🌫': ['fog', 'fog_light'],
+}
+
+
+def get_icon(weather_code):
+    ''' Get weather icon from weather code '''
+    for emoji in WEATHER_ICONS:
+        if weather_code in WEATHER_ICONS[emoji]:
+            return emoji
+    return None
+
+
+def weather_state(emoji, temp):
+    ''' Menu bar state for a weather reading '''
+    return {'icon': None, 'title': f'{emoji} {int(round(temp, 0))}°'}
+
+
+def error_state():
+    ''' Menu bar state when the weather could not be obtained '''
+    return {'icon': ALERT_ICON, 'title': ''}
+
+
+class MenuView:
+    def __init__(self, targets=None):
+        self.targets = dict(targets or {})
+        self.rendered = {}
+        self.pending = {}
+
+    def add_target(self, name, target):
+        ''' Register an object, such as a MenuItem, whose fields are staged '''
+        self.targets[name] = target
+
+    def stage(self, name, **fields):
+        ''' Stage the desired values of fields of a target '''
+        for attribute, value in fields.items():
+            self.pending[(name, attribute)] = value
+
+    def value(self, name, attribute, default=None):
+        ''' The staged value of a field, or the rendered one '''
+        key = (name, attribute)
+        if key in self.pending:
+            return self.pending[key]
+        return self.rendered.get(key, default)
+
+    def changes(self):
+        ''' The staged fields that differ from what was rendered '''
+        return {
+            key: value
+            for key, value in self.pending.items()
+            if key not in self.rendered or self.rendered[key] != value
+        }
+
+    def render(self):
+        '''
+        Apply the staged fields that changed and return how many were set.
+        Must be called on the main thread, like all rumps UI updates.
+        '''
+        changes = self.changes()
+        self.pending = {}
+
+        for (name, attribute), value in changes.items():
+            setattr(self.targets[name], attribute, value)
+            self.rendered[(name, attribute)] = value
+
+        return len(changes)
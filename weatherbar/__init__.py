@@ -0,0 +1 @@
+''' Run WeatherBar from the command line with python -m weatherbar '''